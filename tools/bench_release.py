@@ -0,0 +1,570 @@
+#!/usr/bin/env python3
+"""
+bench_release.py
+
+End-to-end benchmarks for tools/sync_repos.py and tools/commit_release.py.
+
+- Generates a synthetic repo (git fast-import) with --commits commits, --files text files and
+  --binaries incompressible files of --binary-mb each.
+- Private and public remotes are local bare repos; the AI summary goes to a local stand-in for the
+  OpenAI-compatible /chat/completions endpoint. No network access or API key is needed.
+- Scenarios:
+  - sync:unborn, sync:snapshot, sync:cherry-pick and sync:merge-tree run sync_repos.py once to warm
+    up (reported as "cold"). Each timed run then adds one commit and syncs again.
+  - release runs commit_release.py --bump patch --tag --summarize --push over the whole history.
+  - release:slow-ai is the same release against a stand-in that takes longer than --summary-budget
+    to answer; a run fails if it waits past the budget or does not finish without the summary.
+  - release:hedged leads with that slow stand-in and names the normal one as --summary-fallback;
+    a run fails unless the hedged request brings the summary in within the budget.
+  - classify sorts --subjects synthetic commit subjects into note buckets in-process, with
+    commit_release.py's header dispatch and with the nine-regex loop it replaced. No repo is needed.
+- Phase times come from the scripts' --trace output. Spawned git processes and remote round trips
+  come from the sync summary.
+- Results are written as JSON (--out). With --baseline, the run exits 1 when a median is slower
+  than the baseline by more than --threshold (and by at least --min-delta seconds).
+
+Examples:
+  python tools/bench_release.py --commits 2000 --files 5000 --out bench.json
+  python tools/bench_release.py --baseline bench.json --threshold 0.25 --out bench-new.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+SYNC_SCRIPT = os.path.join(TOOLS_DIR, "sync_repos.py")
+RELEASE_SCRIPT = os.path.join(TOOLS_DIR, "commit_release.py")
+
+SCENARIOS = ["sync:unborn", "sync:snapshot", "sync:cherry-pick", "sync:merge-tree", "release", "release:slow-ai",
+             "release:hedged", "classify"]
+# --summary-hedge-after for release:hedged
+HEDGE_AFTER = 0.3
+
+# Fixed identity and dates keep the generated history identical between runs with the same --seed
+GIT_ENV = {
+    "GIT_AUTHOR_NAME": "Bench", "GIT_AUTHOR_EMAIL": "bench@example.com",
+    "GIT_COMMITTER_NAME": "Bench", "GIT_COMMITTER_EMAIL": "bench@example.com",
+    "GIT_CONFIG_NOSYSTEM": "1",
+}
+AUTHORS = ["Ada Lovelace", "Grace Hopper", "Linus Torvalds", "Margaret Hamilton"]
+COMMIT_TYPES = ["feat", "fix", "docs", "perf", "refactor", "build", "ci", "test", "chore", None]
+SCOPES = [None, "ui", "api", "orbit", "build"]
+
+SPAWNS_RE = re.compile(r"Git processes spawned: (\d+)(?:; remote round trips: (\d+))?")
+
+def git(args, cwd, input=None):
+    r = subprocess.run(["git", *args], cwd=cwd, input=input, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                       env={**os.environ, **GIT_ENV})
+    if r.returncode != 0:
+        raise RuntimeError(f"git {' '.join(args)} failed in {cwd}:\n{r.stderr.decode('utf-8', 'replace').strip()}")
+    return r.stdout.decode("utf-8", "replace").strip()
+
+# ---------- Synthetic repositories ----------
+
+def text_path(i):
+    return f"src/dir{i // 100:03d}/file{i:05d}.txt"
+
+def text_content(i, rev=0):
+    return "".join(f"line {n} of file {i} (rev {rev})\n" for n in range(20)).encode("utf-8")
+
+def random_bytes(rnd, size):
+    return rnd.randbytes(size) if hasattr(rnd, "randbytes") else os.urandom(size)
+
+def base_files(files, binaries, binary_mb, rnd):
+    """(path, bytes) of the initial tree: package.json, readme, text files and binaries."""
+    yield "package.json", json.dumps({"name": "bench", "version": "1.0.0"}, indent=2).encode("utf-8") + b"\n"
+    yield "readme.md", b"# Bench\n\nSynthetic repository for tools/bench_release.py.\n"
+    yield ".gitignore", b"sync_repos.log*\n"
+    for i in range(files):
+        yield text_path(i), text_content(i)
+    for i in range(binaries):
+        yield f"assets/blob{i:03d}.bin", random_bytes(rnd, int(binary_mb * 1024 * 1024))
+
+def commit_subject(n, rnd):
+    kind, scope = rnd.choice(COMMIT_TYPES), rnd.choice(SCOPES)
+    if kind is None:
+        return f"Update generated data {n}"
+    return f"{kind}{f'({scope})' if scope else ''}: change {n}"
+
+def generate_repo(path, commits, files, binaries, binary_mb, seed):
+    """Build a repo with `commits` commits; the first adds every file, the rest each touch one text file."""
+    rnd = random.Random(seed)
+    git(["init", "-q", "-b", "main", path], cwd=None)
+    proc = subprocess.Popen(["git", "fast-import", "--quiet"], cwd=path, stdin=subprocess.PIPE,
+                            env={**os.environ, **GIT_ENV})
+    out = proc.stdin
+    t0 = 1_600_000_000
+
+    def data(blob):
+        out.write(b"data %d\n" % len(blob))
+        out.write(blob)
+        out.write(b"\n")
+
+    for n in range(max(1, commits)):
+        author = AUTHORS[n % len(AUTHORS)]
+        email = author.lower().replace(" ", ".") + "@example.com"
+        stamp = t0 + n * 600
+        out.write(b"commit refs/heads/main\n")
+        out.write(f"author {author} <{email}> {stamp} +0000\n".encode("utf-8"))
+        out.write(f"committer Bench <bench@example.com> {stamp} +0000\n".encode("utf-8"))
+        data(b"chore: initial import" if n == 0 else commit_subject(n, rnd).encode("utf-8"))
+        changes = base_files(files, binaries, binary_mb, rnd) if n == 0 else \
+            [(text_path(n % max(1, files)), text_content(n % max(1, files), n))]
+        for file_path, blob in changes:
+            out.write(f"M 100644 inline {file_path}\n".encode("utf-8"))
+            data(blob)
+    out.close()
+    if proc.wait() != 0:
+        raise RuntimeError("git fast-import failed")
+    git(["reset", "-q", "--hard"], cwd=path)
+
+def write_unborn_repo(path, files, binaries, binary_mb, seed):
+    """A repo with the same files in the working tree and no commits yet."""
+    git(["init", "-q", "-b", "main", path], cwd=None)
+    for file_path, blob in base_files(files, binaries, binary_mb, random.Random(seed)):
+        full = os.path.join(path, file_path)
+        os.makedirs(os.path.dirname(full), exist_ok=True)
+        with open(full, "wb") as f:
+            f.write(blob)
+
+def clone_with_remotes(template, root, name):
+    """Clone the template (hardlinked objects) and give it fresh bare private/public remotes."""
+    work = os.path.join(root, name, "work")
+    git(["clone", "-q", template, work], cwd=None)
+    add_bare_remotes(work, os.path.join(root, name))
+    return work
+
+def add_bare_remotes(work, root):
+    for remote in ("private", "public"):
+        bare = os.path.join(root, f"{remote}.git")
+        git(["init", "-q", "--bare", bare], cwd=None)
+        git(["remote", "add", remote, bare], cwd=work)
+    git(["config", "user.name", "Bench"], cwd=work)
+    git(["config", "user.email", "bench@example.com"], cwd=work)
+
+def advance(work, n):
+    """One new commit touching a single file, like an ordinary change between two syncs."""
+    with open(os.path.join(work, text_path(0)), "ab") as f:
+        f.write(f"bench change {n}\n".encode("utf-8"))
+    git(["commit", "-q", "-am", f"fix: bench change {n}"], cwd=work)
+
+# ---------- Local OpenAI-compatible stand-in ----------
+
+STAND_IN_REPLY = (
+    "- Add synthetic benchmark coverage for release tooling.\n"
+    "- Fix public sync edge cases for new branches.\n"
+    "- Improve changelog generation speed on large histories.\n"
+)
+
+class StandInAI:
+    """
+    Local stand-in for an OpenAI-compatible endpoint: POST <base_url>/chat/completions answers with a
+    fixed reply after `latency` seconds. With "stream": true the reply is sent as server-sent events,
+    one word per event, `token_delay` seconds apart. The first `fail_first` requests get a 503.
+    Speaks HTTP/1.1 with keep-alive and counts requests and connections; use as a context manager.
+    """
+
+    def __init__(self, latency=0.05, token_delay=0.0, fail_first=0):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.fail_first = fail_first
+        self.requests = 0
+        self.connections = 0
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                stand_in.connections += 1
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self.send_error(404)
+                    return
+                try:
+                    payload = json.loads(body or b"{}")
+                except ValueError:
+                    self.send_error(400)
+                    return
+                stand_in.requests += 1
+                if stand_in.requests <= stand_in.fail_first:
+                    self.send_error(503, "stand-in: simulated overload")
+                    return
+                time.sleep(stand_in.latency)
+                if payload.get("stream"):
+                    self.stream_reply(payload)
+                    return
+                reply = json.dumps({
+                    "id": f"bench-{stand_in.requests}", "object": "chat.completion",
+                    "model": payload.get("model", "bench"),
+                    "choices": [{"index": 0, "finish_reason": "stop",
+                                 "message": {"role": "assistant", "content": STAND_IN_REPLY}}],
+                    "usage": {"prompt_tokens": len(body) // 4, "completion_tokens": len(STAND_IN_REPLY) // 4},
+                }).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(reply)))
+                self.end_headers()
+                self.wfile.write(reply)
+
+            def stream_reply(self, payload):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Cache-Control", "no-cache")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+
+                def chunk(data):
+                    self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                    self.wfile.flush()
+
+                try:
+                    for token in re.findall(r"\S+\s*", STAND_IN_REPLY):
+                        event = {"id": f"bench-{stand_in.requests}", "object": "chat.completion.chunk",
+                                 "model": payload.get("model", "bench"),
+                                 "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+                        chunk(f"data: {json.dumps(event)}\n\n".encode("utf-8"))
+                        time.sleep(stand_in.token_delay)
+                    chunk(b"data: [DONE]\n\n")
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    self.close_connection = True    # the client gave up (e.g. its latency budget ran out)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, name="stand-in-ai", daemon=True)
+
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/v1"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+        self.server.server_close()
+
+# ---------- Running and timing ----------
+
+def phase_times(trace_path):
+    """Seconds per phase name in a --trace file (repeated phases, e.g. several mirrors, are summed)."""
+    try:
+        with open(trace_path, "r", encoding="utf-8") as f:
+            events = json.load(f).get("traceEvents", [])
+    except (OSError, ValueError):
+        return {}
+    phases = {}
+    for e in events:
+        if e.get("ph") == "X" and e.get("cat") == "phase":
+            phases[e["name"]] = phases.get(e["name"], 0.0) + e["dur"] / 1e6
+    return phases
+
+def timed_run(cmd, cwd, trace_path):
+    started = time.perf_counter()
+    r = subprocess.run(cmd, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True,
+                       env={**os.environ, **GIT_ENV})
+    elapsed = time.perf_counter() - started
+    phases = phase_times(trace_path)
+    # commit_release.py --push traces the sync run next to its own trace
+    sync_trace = os.path.splitext(trace_path)[0] + ".sync.json"
+    phases.update({f"sync: {name}": secs for name, secs in phase_times(sync_trace).items()})
+    sample = {"wall": elapsed, "phases": phases, "ok": r.returncode == 0, "summary": "AI summary added" in r.stdout}
+    m = SPAWNS_RE.search(r.stdout)
+    if m:
+        sample["git_spawns"] = int(m.group(1))
+        if m.group(2):
+            sample["round_trips"] = int(m.group(2))
+    if r.returncode != 0:
+        sample["error"] = r.stdout.strip()[-2000:]
+    return sample
+
+def sync_cmd(mode, trace_path):
+    return [sys.executable, SYNC_SCRIPT, "--public-mode", mode, "--trace", trace_path, "--trace-top", "0"]
+
+def release_cmd(since, ai_url, trace_path, budget, extra=()):
+    # No summary cache: every timed run should pay for (or overlap) a real request
+    return [sys.executable, RELEASE_SCRIPT, "--since", since, "--bump", "patch", "--tag",
+            "--summarize", "--summary-base-url", ai_url, "--summary-api-key", "bench", "--summary-model", "bench",
+            "--summary-budget", str(budget), "--summary-cache-ttl", "0", *extra,
+            "--push", "--sync-script", SYNC_SCRIPT, "--trace", trace_path, "--trace-top", "0"]
+
+def release_check(name, sample, budget):
+    """Why a release sample misbehaved for its scenario, or None."""
+    waited = sample["phases"].get("wait for ai summary", 0)
+    if name == "release:slow-ai":
+        if waited > budget + 0.5:
+            return f"waited {waited:.2f}s for a {budget:g}s budget"
+    elif not sample["summary"]:
+        # For release:hedged the lead stand-in answers only after the budget, so a summary means the hedge won
+        return "no AI summary was added"
+    return None
+
+def run_scenario(name, root, template, args, ai, slow_ai):
+    """Warm-up run ("cold") plus args.runs timed runs; returns the list of samples."""
+    scenario_dir = os.path.join(root, name.replace(":", "-"))
+    traces = os.path.join(scenario_dir, "traces")
+    if name == "sync:unborn":
+        work = os.path.join(scenario_dir, "work")
+        write_unborn_repo(work, args.files, args.binaries, args.binary_mb, args.seed)
+        add_bare_remotes(work, scenario_dir)
+    else:
+        work = clone_with_remotes(template, root, name.replace(":", "-"))
+    os.makedirs(traces, exist_ok=True)
+    root_commit = None if name == "sync:unborn" else git(["rev-list", "--max-parents=0", "HEAD"], cwd=work)
+
+    samples = []
+    for n in range(args.runs + 1):
+        trace_path = os.path.join(traces, f"run{n}.json")
+        if name.startswith("release"):
+            if n == 0:
+                # Publish once so the timed runs push increments, as a real release would
+                subprocess.run(sync_cmd("cherry-pick", os.path.join(traces, "init.json")), cwd=work,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, env={**os.environ, **GIT_ENV})
+            advance(work, n)
+            # release:hedged leads with the slow stand-in and must be rescued by the fast one
+            url, extra = ai.base_url, ()
+            if name == "release:slow-ai":
+                url = slow_ai.base_url
+            elif name == "release:hedged":
+                url, extra = slow_ai.base_url, ("--summary-fallback", ai.base_url,
+                                                "--summary-hedge-after", str(HEDGE_AFTER))
+            sample = timed_run(release_cmd(root_commit, url, trace_path, args.summary_budget, extra), work, trace_path)
+            problem = release_check(name, sample, args.summary_budget) if sample["ok"] else None
+            if problem:
+                sample["ok"] = False
+                sample["error"] = problem
+        else:
+            if n > 0 and name != "sync:unborn":
+                advance(work, n)
+            sample = timed_run(sync_cmd(name.split(":", 1)[1] if name != "sync:unborn" else "snapshot", trace_path),
+                               work, trace_path)
+        sample["cold"] = n == 0
+        samples.append(sample)
+        status = "ok" if sample["ok"] else "FAILED"
+        print(f"   {name:<18} {'cold' if n == 0 else f'run {n}':<6} {sample['wall']:8.3f}s  {status}")
+        if not sample["ok"]:
+            print("      " + sample["error"].splitlines()[-1] if sample["error"] else "")
+    return samples
+
+# ---------- Commit classifier throughput ----------
+
+# The per-bucket regex loop commit_release.py used before BucketRules, kept as the comparison point
+LEGACY_PATTERNS = [
+    (name, re.compile(rf"^{kind}(\(.+\))?!?:", re.I))
+    for name, kind in [("Features", "feat"), ("Fixes", "fix"), ("Docs", "docs"), ("Performance", "perf"),
+                       ("Refactors", "refactor"), ("Build", "build"), ("CI", "ci"), ("Tests", "test"),
+                       ("Chores", "chore")]
+]
+
+def legacy_counts(subjects):
+    counts = {}
+    for subject in subjects:
+        for name, rx in LEGACY_PATTERNS:
+            if rx.search(subject):
+                break
+        else:
+            name = "Other"
+        counts[name] = counts.get(name, 0) + 1
+    return counts
+
+def dispatch_counts(subjects, rules):
+    counts = {}
+    classify = rules.classify
+    for subject in subjects:
+        name = classify(subject)[0]
+        counts[name] = counts.get(name, 0) + 1
+    return counts
+
+def run_classify(args):
+    """Time both classifiers over the same subjects; a sample fails if their bucket counts differ."""
+    sys.path.insert(0, TOOLS_DIR)
+    import commit_release
+    rules = commit_release.load_bucket_rules(None)
+    rnd = random.Random(args.seed)
+    subjects = []
+    for n in range(args.subjects):
+        subject = commit_subject(n, rnd)
+        # A few breaking headers, which the old patterns also had to accept
+        subjects.append(subject.replace(":", "!:", 1) if n % 50 == 0 and ":" in subject else subject)
+
+    samples = []
+    for n in range(args.runs + 1):
+        started = time.perf_counter()
+        before = legacy_counts(subjects)
+        legacy = time.perf_counter() - started
+        started = time.perf_counter()
+        after = dispatch_counts(subjects, rules)
+        dispatch = time.perf_counter() - started
+        sample = {
+            "wall": dispatch, "phases": {"legacy regex loop": legacy, "header dispatch": dispatch},
+            "ok": before == after, "cold": n == 0,
+            "subjects_per_sec": len(subjects) / dispatch, "legacy_subjects_per_sec": len(subjects) / legacy,
+        }
+        if not sample["ok"]:
+            sample["error"] = f"bucket counts differ: {before} vs {after}"
+        samples.append(sample)
+        print(f"   {'classify':<18} {'cold' if n == 0 else f'run {n}':<6} {dispatch:8.3f}s  "
+              f"(legacy {legacy:.3f}s, {legacy / dispatch:.1f}x)  {'ok' if sample['ok'] else 'FAILED'}")
+    return samples
+
+def summarize(samples):
+    """Median/min wall time and median per phase over the timed (warm) runs."""
+    warm = [s for s in samples if not s["cold"]] or samples
+    walls = [s["wall"] for s in warm]
+    phase_names = sorted({p for s in warm for p in s["phases"]})
+    result = {
+        "median": statistics.median(walls), "min": min(walls), "runs": walls,
+        "cold": next((s["wall"] for s in samples if s["cold"]), None),
+        "phases": {p: statistics.median([s["phases"].get(p, 0.0) for s in warm]) for p in phase_names},
+        "failed": sum(1 for s in samples if not s["ok"]),
+    }
+    for key in ("git_spawns", "round_trips", "subjects_per_sec", "legacy_subjects_per_sec"):
+        values = [s[key] for s in warm if key in s]
+        if values:
+            result[key] = statistics.median(values)
+    errors = [s["error"] for s in samples if not s["ok"] and s.get("error")]
+    if errors:
+        result["error"] = errors[0]
+    return result
+
+def find_regressions(results, baseline, threshold, min_delta):
+    """(scenario, metric, baseline s, current s) for every median slower than allowed."""
+    found = []
+    for name, cur in results["scenarios"].items():
+        base = baseline.get("scenarios", {}).get(name)
+        if not base:
+            continue
+        pairs = [("wall", base.get("median"), cur["median"])]
+        pairs += [(f"phase:{p}", base.get("phases", {}).get(p), v) for p, v in cur["phases"].items()]
+        for metric, before, now in pairs:
+            if before is None:
+                continue
+            if now > before * (1 + threshold) and now - before >= min_delta:
+                found.append((name, metric, before, now))
+    return found
+
+# ---------- CLI ----------
+
+def parse_args():
+    p = argparse.ArgumentParser(description="Benchmark sync_repos.py and commit_release.py on synthetic repos.")
+    p.add_argument("--commits", type=int, default=500, help="Commits in the synthetic history (default: 500)")
+    p.add_argument("--files", type=int, default=2000, help="Text files in the tree (default: 2000)")
+    p.add_argument("--binaries", type=int, default=4, help="Binary files in the tree (default: 4)")
+    p.add_argument("--binary-mb", type=float, default=1.0, help="Size of each binary file in MB (default: 1)")
+    p.add_argument("--runs", type=int, default=3, help="Timed runs per scenario after the warm-up (default: 3)")
+    p.add_argument("--scenarios", default=",".join(SCENARIOS),
+                   help=f"Comma-separated subset of: {', '.join(SCENARIOS)}")
+    p.add_argument("--subjects", type=int, default=1_000_000,
+                   help="Commit subjects for the classify scenario (default: 1000000)")
+    p.add_argument("--ai-latency-ms", type=float, default=50,
+                   help="Stand-in AI endpoint delay before the first token (default: 50)")
+    p.add_argument("--ai-token-ms", type=float, default=5,
+                   help="Stand-in AI delay between streamed tokens (default: 5)")
+    p.add_argument("--summary-budget", type=float, default=2,
+                   help="--summary-budget passed to commit_release.py (default: 2)")
+    p.add_argument("--seed", type=int, default=1, help="Seed for the synthetic history and binary content")
+    p.add_argument("--out", default="bench_results.json", help="Where to write the JSON results")
+    p.add_argument("--baseline", help="Previous results JSON to compare against")
+    p.add_argument("--threshold", type=float, default=0.25,
+                   help="Allowed slowdown versus --baseline as a fraction (default: 0.25 = 25%%)")
+    p.add_argument("--min-delta", type=float, default=0.05,
+                   help="Ignore slowdowns smaller than this many seconds (default: 0.05)")
+    p.add_argument("--workdir", help="Directory for the synthetic repos (default: a temp dir)")
+    p.add_argument("--keep", action="store_true", help="Keep the synthetic repos and traces afterwards")
+    return p.parse_args()
+
+def main():
+    args = parse_args()
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        sys.exit(f"❌ Unknown scenario(s): {', '.join(sorted(unknown))}")
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+
+    root = args.workdir or tempfile.mkdtemp(prefix="bench-release-")
+    os.makedirs(root, exist_ok=True)
+    params = {k: getattr(args, k) for k in ("commits", "files", "binaries", "binary_mb", "runs", "subjects",
+                                            "ai_latency_ms", "ai_token_ms", "summary_budget", "seed")}
+    results = {
+        "meta": {
+            "ts": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "git": git(["--version"], cwd=None), "python": platform.python_version(),
+            "platform": platform.platform(), "params": params,
+        },
+        "scenarios": {},
+    }
+    try:
+        template = os.path.join(root, "template")
+        started = time.perf_counter()
+        if any(s not in ("sync:unborn", "classify") for s in scenarios):
+            print(f"→ Generating synthetic repo: {args.commits} commits, {args.files} files, "
+                  f"{args.binaries} × {args.binary_mb:g} MB binaries …")
+            generate_repo(template, args.commits, args.files, args.binaries, args.binary_mb, args.seed)
+        results["meta"]["generate_secs"] = round(time.perf_counter() - started, 3)
+
+        token_delay = args.ai_token_ms / 1000
+        with StandInAI(latency=args.ai_latency_ms / 1000, token_delay=token_delay) as ai, \
+                StandInAI(latency=args.summary_budget + 5, token_delay=token_delay) as slow_ai:
+            for name in scenarios:
+                samples = run_classify(args) if name == "classify" else run_scenario(name, root, template, args, ai, slow_ai)
+                results["scenarios"][name] = summarize(samples)
+            results["meta"]["ai_requests"] = ai.requests
+    finally:
+        if not args.keep and not args.workdir:
+            shutil.rmtree(root, ignore_errors=True)
+
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+        f.write("\n")
+
+    print(f"\n📋 Results (median of {args.runs} warm runs) → {args.out}")
+    for name, r in results["scenarios"].items():
+        extra = f"  ({r['git_spawns']:g} git processes)" if "git_spawns" in r else ""
+        if "subjects_per_sec" in r:
+            extra = (f"  ({r['subjects_per_sec']:,.0f} subjects/s; "
+                     f"legacy loop {r['legacy_subjects_per_sec']:,.0f}/s)")
+        print(f"   {name:<18} {r['median']:8.3f}s  cold {r['cold']:.3f}s{extra}")
+        for phase, secs in sorted(r["phases"].items(), key=lambda kv: kv[1], reverse=True)[:6]:
+            print(f"      {secs:8.3f}s  {phase}")
+
+    failed = [name for name, r in results["scenarios"].items() if r["failed"]]
+    if failed:
+        print(f"\n❌ Failed runs in: {', '.join(failed)}")
+    if baseline:
+        if baseline.get("meta", {}).get("params") != params:
+            print("⚠️  Baseline was recorded with different parameters; comparisons may not be meaningful.")
+        regressions = find_regressions(results, baseline, args.threshold, args.min_delta)
+        if regressions:
+            print(f"\n❌ Regressions over {args.threshold:.0%} (and {args.min_delta:g}s):")
+            for name, metric, before, now in regressions:
+                print(f"   {name} {metric}: {before:.3f}s → {now:.3f}s (+{(now / before - 1) if before else 0:.0%})")
+            return 1
+        print(f"\n✓ No regressions over {args.threshold:.0%} against {args.baseline}.")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
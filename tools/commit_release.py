@@ -1,58 +1,150 @@
-#!/usr/bin/env python3
-# -*- coding: utf-8 -*-
-"""
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
 commit_release.py
 - Build changelog & README notes from recent commits.
 - Optional AI-written summary (OpenAI-compatible).
 - Optional semver bump in package.json and tag.
 - Optional push via tools/sync_repos.py after committing.
-"""
-
-from __future__ import annotations
-import argparse
-import datetime as dt
-import json
-import os
-import re
-import subprocess
-import sys
-from pathlib import Path
-from typing import Dict, List, Tuple, Optional
-from urllib import request
-
-REPO = Path.cwd()
-PKG_JSON = REPO / "package.json"
-
-LATEST_START = "<!-- LATEST-CHANGES-START -->"
-LATEST_END   = "<!-- LATEST-CHANGES-END -->"
-
-# Conventional buckets
-import re
-BUCKET_PATTERNS = [
-    ("Features",       re.compile(r"^feat(\(.+\))?:", re.I)),
-    ("Fixes",          re.compile(r"^fix(\(.+\))?:", re.I)),
-    ("Docs",           re.compile(r"^docs(\(.+\))?:", re.I)),
-    ("Performance",    re.compile(r"^perf(\(.+\))?:", re.I)),
-    ("Refactors",      re.compile(r"^refactor(\(.+\))?:", re.I)),
-    ("Build",          re.compile(r"^build(\(.+\))?:", re.I)),
-    ("CI",             re.compile(r"^ci(\(.+\))?:", re.I)),
-    ("Tests",          re.compile(r"^test(\(.+\))?:", re.I)),
-    ("Chores",         re.compile(r"^chore(\(.+\))?:", re.I)),
-]
-OTHER_BUCKET = "Other"
-
-def run(cmd: List[str], check: bool = True, env: Optional[Dict[str, str]] = None) -> Tuple[int, str, str]:
-    res = subprocess.run(cmd, cwd=str(REPO), text=True, env=env,
-                         stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    if check and res.returncode != 0:
-        raise RuntimeError(f"Command failed: {' '.join(cmd)}\nstdout:\n{res.stdout}\nstderr:\n{res.stderr}")
-    return res.returncode, res.stdout.strip(), res.stderr.strip()
-
-def ensure_git_repo():
-    _, out, _ = run(["git", "rev-parse", "--is-inside-work-tree"])
-    if out.lower() != "true":
-        sys.exit("❌ Not inside a Git repository.")
-
+"""
+
+from __future__ import annotations
+import argparse
+import datetime as dt
+import hashlib
+import http.client
+import io
+import json
+import os
+import queue
+import random
+import re
+import socket
+import sqlite3
+import stat
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout, as_completed
+from contextlib import contextmanager, nullcontext, suppress
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, FrozenSet, Iterable, Iterator, List, Tuple, Optional
+from urllib import request
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlsplit
+from urllib.request import getproxies, proxy_bypass
+
+REPO = Path.cwd()
+PKG_JSON = REPO / "package.json"
+
+LATEST_START = "<!-- LATEST-CHANGES-START -->"
+LATEST_END   = "<!-- LATEST-CHANGES-END -->"
+
+# Conventional-commit header "type(scope)!:", parsed once per subject (see BucketRules.classify)
+HEADER_RE = re.compile(r"^(\w+)(?:\(([^)]*)\))?(!)?:")
+
+# Built-in buckets in changelog order: (section, commit types); .release-buckets.json replaces them
+DEFAULT_BUCKETS = [
+    ("Features",       ("feat",)),
+    ("Fixes",          ("fix",)),
+    ("Docs",           ("docs",)),
+    ("Performance",    ("perf",)),
+    ("Refactors",      ("refactor",)),
+    ("Build",          ("build",)),
+    ("CI",             ("ci",)),
+    ("Tests",          ("test",)),
+    ("Chores",         ("chore",)),
+]
+OTHER_BUCKET = "Other"
+BREAKING_BUCKET = "Breaking Changes"
+BUCKETS_FILE = ".release-buckets.json"
+
+class Tracer:
+    """Collects Chrome trace-event spans ("ph": "X") for --trace; open the file in chrome://tracing or Perfetto."""
+
+    def __init__(self):
+        self.events: List[dict] = []
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self._tids: Dict[int, int] = {}
+
+    def _tid(self) -> int:
+        # Small stable thread ids, named after the thread (same scheme as sync_repos.py)
+        ident = threading.get_ident()
+        if ident not in self._tids:
+            self._tids[ident] = len(self._tids) + 1
+            self.events.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": self._tids[ident],
+                                "args": {"name": threading.current_thread().name}})
+        return self._tids[ident]
+
+    def add(self, name: str, cat: str, start: float, end: float, args: Optional[dict] = None):
+        with self._lock:
+            self.events.append({
+                "name": name, "cat": cat, "ph": "X", "pid": os.getpid(), "tid": self._tid(),
+                "ts": round((start - self._t0) * 1e6), "dur": round((end - start) * 1e6),
+                "args": args or {},
+            })
+
+    @contextmanager
+    def span(self, name: str, cat: str = "phase"):
+        start = time.perf_counter()
+        args: dict = {}
+        try:
+            yield args
+        except BaseException as e:
+            args["error"] = str(e).splitlines()[0] if str(e) else type(e).__name__
+            raise
+        finally:
+            self.add(name, cat, start, time.perf_counter(), args)
+
+    def write(self, path: str):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+
+    def slowest(self, top: int, cat: str) -> List[dict]:
+        spans = [e for e in self.events if e["ph"] == "X" and e["cat"] == cat]
+        return sorted(spans, key=lambda e: e["dur"], reverse=True)[:top]
+
+# Set by --trace
+TRACER: Optional[Tracer] = None
+
+def trace_span(name: str, cat: str = "phase"):
+    return TRACER.span(name, cat) if TRACER else nullcontext({})
+
+def write_trace(path: str, top: int):
+    try:
+        TRACER.write(path)
+    except OSError as e:
+        print(f"⚠️  Could not write trace {path}: {e}")
+        return
+    print(f"⏱️  Trace written to {path}.")
+    print("   Slowest phases:")
+    for e in TRACER.slowest(top, "phase"):
+        print(f"   {e['dur'] / 1e6:8.3f}s  {e['name']}")
+    print("   Slowest commands:")
+    for e in TRACER.slowest(top, "git"):
+        a = e["args"]
+        out = f", {a['stdout_bytes'] + a['stderr_bytes']} B out" if "stdout_bytes" in a else ""
+        print(f"   {e['dur'] / 1e6:8.3f}s  {e['name']}  (exit {a.get('exit_code', '?')}{out})")
+
+def run(cmd: List[str], check: bool = True, env: Optional[Dict[str, str]] = None) -> Tuple[int, str, str]:
+    with trace_span(" ".join(cmd), "git") as span:
+        res = subprocess.run(cmd, cwd=str(REPO), text=True, env=env,
+                             stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        span.update(exit_code=res.returncode, stdout_bytes=len(res.stdout.encode("utf-8")),
+                    stderr_bytes=len(res.stderr.encode("utf-8")))
+    if check and res.returncode != 0:
+        raise RuntimeError(f"Command failed: {' '.join(cmd)}\nstdout:\n{res.stdout}\nstderr:\n{res.stderr}")
+    return res.returncode, res.stdout.strip(), res.stderr.strip()
+
+def ensure_git_repo():
+    _, out, _ = run(["git", "rev-parse", "--is-inside-work-tree"])
+    if out.lower() != "true":
+        sys.exit("❌ Not inside a Git repository.")
+
 def ensure_clean_worktree(allow_dirty: bool):
     if allow_dirty:
         return
@@ -79,402 +171,1669 @@ def ensure_clean_worktree(allow_dirty: bool):
             # Fall through to default exit if any prompt fails
             pass
         sys.exit("❌ Working tree not clean. Commit/stash or use --allow-dirty.")
-
-def is_unborn_head() -> bool:
-    rc, _, _ = run(["git", "rev-parse", "HEAD"], check=False)
-    return rc != 0
-
-def current_branch_guess() -> str:
-    rc, out, _ = run(["git", "symbolic-ref", "--short", "HEAD"], check=False)
-    return out if rc == 0 and out else "main"
-
-def last_tag_or_root() -> str:
-    rc, tag, _ = run(["git", "describe", "--tags", "--abbrev=0"], check=False)
-    if rc == 0 and tag:
-        return tag
-    _, root, _ = run(["git", "rev-list", "--max-parents=0", "HEAD"])
-    return root
-
-def get_commits_since(since_ref: str) -> List[Tuple[str, str, str, str]]:
-    fmt = "%h%x09%s%x09%an%x09%H"
-    rc, out, _ = run(["git", "log", f"{since_ref}..HEAD", "--no-merges", f"--pretty=format:{fmt}"], check=False)
-    if rc != 0 or not out.strip():
-        return []
-    commits = []
-    for line in out.splitlines():
-        parts = line.split("\t")
-        if len(parts) != 4:
-            h, rest = parts[0], "\t".join(parts[1:])
-            sub, auth, full = rest.rsplit("\t", 3)
-            parts = [h, sub, auth, full]
-        short, subject, author, full_hash = parts
-        commits.append((short, subject.strip(), author.strip(), full_hash))
-    return commits
-
-def top_changed_files_since(since_ref: str, limit: int = 20) -> List[str]:
-    rc, out, _ = run(["git", "diff", "--name-only", f"{since_ref}..HEAD"], check=False)
-    if rc != 0 or not out.strip():
-        return []
-    files = out.splitlines()
-    return files[:limit]
-
-def shortstat_since(since_ref: str) -> str:
-    rc, out, _ = run(["git", "diff", "--shortstat", f"{since_ref}..HEAD"], check=False)
-    return out.strip() if rc == 0 and out.strip() else ""
-
-def bucketize(commits: List[Tuple[str, str, str, str]]) -> Dict[str, List[str]]:
-    buckets: Dict[str, List[str]] = {name: [] for name, _ in BUCKET_PATTERNS}
-    buckets[OTHER_BUCKET] = []
-    for short, subject, author, _ in commits:
-        line = f"- {subject} ({author}, {short})"
-        matched = False
-        for name, rx in BUCKET_PATTERNS:
-            if rx.search(subject):
-                buckets[name].append(line)
-                matched = True
-                break
-        if not matched:
-            buckets[OTHER_BUCKET].append(line)
-    return {k: v for k, v in buckets.items() if v}
-
-def build_notes(since_ref: str) -> List[str]:
-    commits = get_commits_since(since_ref)
-    if not commits:
-        return ["No changes."]
-    buckets = bucketize(commits)
-    lines: List[str] = []
-    for name in ["Features","Fixes","Docs","Performance","Refactors","Build","CI","Tests","Chores",OTHER_BUCKET]:
-        items = buckets.get(name)
-        if not items:
-            continue
-        lines.append(f"### {name}")
-        lines.extend(items)
-        lines.append("")
-    if lines and lines[-1] == "":
-        lines.pop()
-    return lines
-
-# ---- case-resolving helpers for Windows/macOS ----
-def resolve_existing(path_candidates: List[str]) -> Path:
-    for name in path_candidates:
-        p = REPO / name
-        if p.exists():
-            return p
-    for name in path_candidates:
-        for child in REPO.iterdir():
-            if child.name.lower() == name.lower():
-                return child
-    return REPO / path_candidates[0]
-
-def paths_for_docs() -> Tuple[Path, Path]:
-    changelog = resolve_existing(["CHANGELOG.md", "Changelog.md", "changelog.md"])
-    readme    = resolve_existing(["README.md", "Readme.md", "readme.md"])
-    return changelog, readme
-
-def prepend_changelog(changelog_path: Path, section_title: str, notes: List[str], summary_block: Optional[List[str]] = None):
-    header = "# Changelog"
-    existing = changelog_path.read_text(encoding="utf-8") if changelog_path.exists() else ""
-    has_header = existing.lstrip().startswith(header)
-
-    new_section: List[str] = [f"## {section_title}", ""]
-    if summary_block:
-        new_section += summary_block + [""]
-    new_section += notes + [""]
-
-    pieces: List[str] = []
-    if not has_header:
-        pieces += [header, ""]
-    pieces += new_section
-    if existing:
-        pieces.append(existing.rstrip())
-        pieces.append("")
-
-    changelog_path.write_text("\n".join(pieces), encoding="utf-8")
-
-def update_readme_latest(readme_path: Path, notes: List[str], summary_block: Optional[List[str]] = None):
-    existing = readme_path.read_text(encoding="utf-8") if readme_path.exists() else ""
-    body_lines: List[str] = []
-    if summary_block:
-        body_lines += ["### Summary"] + summary_block + [""]
-    body_lines += notes
-    block = f"{LATEST_START}\n" + "\n".join(body_lines) + f"\n{LATEST_END}\n"
-
-    if LATEST_START in existing and LATEST_END in existing:
-        pre, rest = existing.split(LATEST_START, 1)
-        _, post = rest.split(LATEST_END, 1)
-        new_body = pre + block + post
-    else:
-        appendix = "\n## Latest changes\n\n" + block
-        new_body = existing + appendix
-
-    readme_path.write_text(new_body, encoding="utf-8")
-
-def read_package_version() -> Optional[str]:
-    if not PKG_JSON.exists():
-        return None
-    try:
-        data = json.loads(PKG_JSON.read_text(encoding="utf-8"))
-        return str(data.get("version")) if "version" in data else None
-    except Exception:
-        return None
-
-def bump_semver(ver: str, kind: str) -> str:
-    try:
-        major, minor, patch = [int(x) for x in ver.split(".")]
-    except Exception:
-        raise ValueError(f"package.json version '{ver}' is not MAJOR.MINOR.PATCH")
-    if kind == "major":
-        return f"{major+1}.0.0"
-    if kind == "minor":
-        return f"{major}.{minor+1}.0"
-    if kind == "patch":
-        return f"{major}.{minor}.{patch+1}"
-    return ver
-
-def write_package_version(new_ver: str):
-    data = json.loads(PKG_JSON.read_text(encoding="utf-8"))
-    data["version"] = new_ver
-    PKG_JSON.write_text(json.dumps(data, ensure_ascii=False, indent=2) + "\n", encoding="utf-8")
-
-def git_add(paths: List[Path]):
-    run(["git", "add"] + [str(p) for p in paths])
-
-def git_commit(message: str) -> bool:
-    rc, _, _ = run(["git", "diff", "--cached", "--quiet"], check=False)
-    if rc == 0:
-        return False
-    run(["git", "commit", "-m", message])
-    return True
-
-def git_tag(tag: str):
-    run(["git", "tag", tag])
-
-# ---------- AI summary (OpenAI-compatible) ----------
-def resolve_ai_defaults(args) -> Tuple[str, str, str]:
-    model = args.summary_model or os.environ.get("OPENAI_SUMMARY_MODEL", "gpt-5")
-    base = args.summary_base_url or os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1")
-    key = args.summary_api_key or os.environ.get("OPENAI_API_KEY") or ""
-    if not key:
-        key = os.environ.get("OPENROUTER_API_KEY", "")
-        if key and not args.summary_base_url:
-            base = "https://openrouter.ai/api/v1"
-    if not key:
-        key = os.environ.get("GROQ_API_KEY", "")
-        if key and not args.summary_base_url:
-            base = "https://api.groq.com/openai/v1"
-    if not key:
-        key = os.environ.get("AZURE_OPENAI_API_KEY", "")
-    if not key:
-        key = os.environ.get("OLLAMA_API_KEY", "ollama")
-        if not args.summary_base_url:
-            base = "http://localhost:11434/v1"
-    return model, base, key
-
-def ai_chat_completion(model: str, base_url: str, api_key: str, system_msg: str, user_msg: str, max_tokens: int = 400) -> str:
-    payload = {
-        "model": model,
-        "messages": [
-            {"role": "system", "content": system_msg},
-            {"role": "user", "content": user_msg}
-        ],
-        "temperature": 0.3,
-        "max_tokens": max_tokens,
-        "stream": False
-    }
-    data = json.dumps(payload).encode("utf-8")
-    req = request.Request(
-        url=base_url.rstrip("/") + "/chat/completions",
-        data=data, method="POST",
-        headers={"Content-Type": "application/json", "Authorization": f"Bearer {api_key}" if api_key else ""}
-    )
-    with request.urlopen(req, timeout=60) as resp:
-        body = resp.read().decode("utf-8")
-        obj = json.loads(body)
-        return obj["choices"][0]["message"]["content"].strip()
-
-def build_summary_prompt(repo_name: str, branch: str, since_ref: Optional[str],
-                         commits: List[Tuple[str, str, str, str]], files: List[str],
-                         shortstat: str) -> Tuple[str, str]:
-    sys_msg = (
-        "You are a precise release-notes writer. Produce a terse, executive summary for developers and PMs. "
-        "Focus on capabilities, fixes, and potential user-visible changes. Avoid marketing fluff."
-    )
-    commit_lines = "\n".join(f"- {s} ({a}, {h})" for h, s, a, _ in commits[:100])
-    files_lines = "\n".join(f"- {f}" for f in files[:30])
-    user_msg = (
-        f"Repository: {repo_name}\n"
-        f"Branch: {branch}\n"
-        f"Range start: {since_ref or 'N/A (initial)'}\n"
-        f"Changes shortstat: {shortstat or 'n/a'}\n\n"
-        f"Top changed files:\n{files_lines or '- n/a'}\n\n"
-        f"Commit subjects:\n{commit_lines or '- Initial release'}\n\n"
-        "Write 3–6 bullet points. Each bullet should be one sentence and start with an action verb. "
-        "If there are breaking changes, include a final bullet starting with 'BREAKING:'. Do not invent details."
-    )
-    return sys_msg, user_msg
-
-# ---------- Args ----------
-def parse_args():
-    ap = argparse.ArgumentParser(description="Update CHANGELOG.md & README.md; optional AI summary, version bump, tag, and push.")
-    ap.add_argument("--bump", choices=["major", "minor", "patch", "none"], default="none", help="Semver bump in package.json")
-    ap.add_argument("--tag", action="store_true", help="Create a git tag after bump (vX.Y.Z)")
-    ap.add_argument("--since", help="Start ref (tag/hash). Default: last tag or root")
-    ap.add_argument("--allow-dirty", action="store_true", help="Skip clean worktree check")
-    ap.add_argument("--section-title", help="Changelog section title (default: YYYY-MM-DD)")
-
-    # AI summary
-    ap.add_argument("--summarize", action="store_true", help="Generate an AI-written summary section")
-    ap.add_argument("--summary-model", help="OpenAI-compatible model name (default: env or 'gpt-5')")
-    ap.add_argument("--summary-base-url", help="Base URL for OpenAI-compatible API")
-    ap.add_argument("--summary-api-key", help="API key (OPENAI_API_KEY/OPENROUTER_API_KEY/etc.)")
-    ap.add_argument("--summary-max-tokens", type=int, default=400, help="Max tokens for summary")
-
-    # Push options (uses sync_repos.py v4)
-    ap.add_argument("--push-private", action="store_true", help="After commit, push to private using sync_repos.py")
-    ap.add_argument("--push-public", action="store_true", help="After commit, push to public using sync_repos.py")
-    ap.add_argument("--push", action="store_true", help="After commit, push to private and public (shortcut)")
-
-    ap.add_argument("--private-remote", default="private", help="Private remote name for sync_repos.py")
-    ap.add_argument("--public-remote",  default="public",  help="Public remote name for sync_repos.py")
-    ap.add_argument("--public-branch",  default="main",    help="Public branch name for sync_repos.py")
-    ap.add_argument("--public-mode",    choices=["cherry-pick", "snapshot"], default="cherry-pick",
-                    help="Public push mode (sync_repos.py)")
-
-    ap.add_argument("--sync-script", default=str(REPO / "tools" / "sync_repos.py"),
-                    help="Path to sync_repos.py (default: tools/sync_repos.py)")
-    ap.add_argument("--sync-verbose", action="store_true", help="Pass --verbose to sync_repos.py")
-    return ap.parse_args()
-
-# ---------- Main ----------
-def main():
-    ensure_git_repo()
-    args = parse_args()
-    ensure_clean_worktree(args.allow_dirty)
-
-    unborn = is_unborn_head()
-    branch = current_branch_guess()
-    repo_name = REPO.name
-
-    since = args.since if args.since else (None if unborn else last_tag_or_root())
-    today = dt.date.today().isoformat()
-    section_title = args.section_title or today
-
-    if unborn:
-        commits, notes, files, stat = [], ["Initial release."], [], ""
-    else:
-        commits = get_commits_since(since)
-        notes   = build_notes(since)
-        files   = top_changed_files_since(since)
-        stat    = shortstat_since(since)
-
-    # Optional AI summary (soft-fail)
-    summary_lines: Optional[List[str]] = None
-    if args.summarize:
-        model, base, key = resolve_ai_defaults(args)
-        try:
-            if not key and not (args.summary_base_url or "").startswith("http://localhost"):
-                raise RuntimeError("No API key found for remote provider.")
-            sys_msg, user_msg = build_summary_prompt(repo_name, branch, since, commits, files, stat)
-            summary = ai_chat_completion(model=model, base_url=base, api_key=key,
-                                         system_msg=sys_msg, user_msg=user_msg,
-                                         max_tokens=args.summary_max_tokens)
-            bullets = [ln.strip(" •-") for ln in summary.splitlines() if ln.strip()]
-            summary_lines = [f"- {b}" for b in bullets[:8]] if bullets else [summary]
-        except Exception as e:
-            print(f"⚠️  Summary generation skipped: {e}")
-
-    # Resolve doc paths & write
-    changelog_path, readme_path = paths_for_docs()
-    prepend_changelog(changelog_path, section_title, notes, summary_block=summary_lines)
-    update_readme_latest(readme_path, notes, summary_block=summary_lines)
-
-    # Optional version bump
-    bumped = None
-    if args.bump != "none" and PKG_JSON.exists():
-        current = read_package_version()
-        if not current:
-            print("⚠️  package.json exists but has no 'version'; skipping bump.")
-        else:
-            bumped = bump_semver(current, args.bump)
-            if bumped != current:
-                write_package_version(bumped)
-                print(f"Version: {current} → {bumped}")
-
-    # Stage & commit (only if something changed)
-    commit_msg = f"chore(release): {today}"
-    if bumped:
-        commit_msg += f", bump version to {bumped}"
-    if summary_lines:
-        commit_msg += " [summary]"
-
-    to_stage = [changelog_path, readme_path] + ([PKG_JSON] if bumped else [])
-    # Stage updated docs and package.json, then ensure index reflects all generated changes
-    git_add(to_stage)
-    # On some platforms/casing/line-ending setups, be conservative and stage all
+
+def is_unborn_head() -> bool:
+    rc, _, _ = run(["git", "rev-parse", "HEAD"], check=False)
+    return rc != 0
+
+def current_branch_guess() -> str:
+    rc, out, _ = run(["git", "symbolic-ref", "--short", "HEAD"], check=False)
+    return out if rc == 0 and out else "main"
+
+def last_tag_or_root() -> str:
+    rc, tag, _ = run(["git", "describe", "--tags", "--abbrev=0"], check=False)
+    if rc == 0 and tag:
+        return tag
+    _, root, _ = run(["git", "rev-list", "--max-parents=0", "HEAD"])
+    return root
+
+def git_dir() -> Path:
+    _, out, _ = run(["git", "rev-parse", "--git-dir"])
+    return REPO / out
+
+TRAILER_RE = re.compile(r"^(BREAKING[ -]CHANGE|[A-Za-z][A-Za-z0-9-]*)\s*:\s*(.*)$")
+BREAKING_KEYS = ("BREAKING CHANGE", "BREAKING-CHANGE")
+
+class CommitRecord:
+    """One commit from iter_commits(); __slots__ keeps the per-commit footprint small."""
+    __slots__ = ("short", "full_hash", "author", "subject", "body", "trailers", "header")
+
+    def __init__(self, short: str, full_hash: str, author: str, subject: str, body: str,
+                 trailers: Tuple[Tuple[str, str], ...], header: Optional[Tuple[str, str, bool]] = None):
+        self.short = short
+        self.full_hash = full_hash
+        self.author = author
+        self.subject = subject
+        self.body = body
+        self.trailers = trailers
+        self.header = header    # BucketRules.classify() result, when the commit cache already has it
+
+    @property
+    def breaking(self) -> Optional[str]:
+        """The BREAKING CHANGE text (or the subject for a `type!:` header), else None."""
+        m = HEADER_RE.match(self.subject)
+        return self.breaking_footer() or (self.subject if m and m.group(3) else None)
+
+    def breaking_footer(self) -> Optional[str]:
+        """The BREAKING CHANGE trailer's text (the subject if it is empty), else None."""
+        for key, value in self.trailers:
+            if key.upper() in BREAKING_KEYS:
+                return value or self.subject
+        return None
+
+# `git commit -m "type: subject\n\nbody"` from a shell stores the escapes literally: a conventional
+# header whose subject runs straight into a literal \n\n and on into the body text
+MISESCAPED_RE = re.compile(r"^\w+(?:\([^)]*\))?!?: [^\n]*?\S\\n\\n\S")
+
+def split_message(message: str) -> Tuple[str, str]:
+    r"""
+    (subject, body) like git's %s/%b: the subject is the first paragraph joined into one line.
+    Literal \n escapes are only unescaped in the mis-escaped `-m` form; a subject that merely
+    mentions \n is kept as is.
+
+    >>> split_message(r"feat: add help panel\n\n- Help: open on click\n")
+    ('feat: add help panel', '- Help: open on click')
+    >>> split_message(r"fix: strip trailing \n from output")
+    ('fix: strip trailing \\n from output', '')
+    >>> split_message(r"fix: handle \n\n separators in parser")
+    ('fix: handle \\n\\n separators in parser', '')
+    """
+    message = message.strip("\n")
+    if "\n" not in message and MISESCAPED_RE.match(message):
+        message = message.replace("\\n", "\n").strip()
+    head, _, body = message.partition("\n\n")
+    return " ".join(line.strip() for line in head.splitlines()).strip(), body.strip("\n")
+
+def parse_trailers(body: str) -> Tuple[Tuple[str, str], ...]:
+    """`Key: value` lines of the body's last paragraph (continuation lines start with whitespace)."""
+    if not body:
+        return ()
+    trailers: List[Tuple[str, str]] = []
+    for line in body.rsplit("\n\n", 1)[-1].splitlines():
+        if line[:1] in (" ", "\t") and trailers:
+            key, value = trailers[-1]
+            trailers[-1] = (key, f"{value} {line.strip()}")
+            continue
+        m = TRAILER_RE.match(line)
+        if not m:
+            return ()
+        trailers.append((m.group(1), m.group(2).strip()))
+    return tuple(trailers)
+
+def parse_commit(raw: bytes) -> Optional[CommitRecord]:
+    fields = raw.decode("utf-8", "replace").lstrip("\n").split("\x1f", 3)
+    if len(fields) != 4:
+        return None
+    short, full_hash, author, message = fields
+    subject, body = split_message(message)
+    return CommitRecord(short, full_hash, author.strip(), subject, body, parse_trailers(body))
+
+LOG_FORMAT = "--format=%h%x1f%H%x1f%an%x1f%B"
+
+def iter_log(args: List[str], stdin_lines: Optional[List[str]] = None) -> Iterator[CommitRecord]:
+    """
+    Stream `git log -z <args>` as CommitRecords with full messages (stdin_lines go to --stdin).
+
+    Reads the pipe in chunks and yields each commit as soon as its NUL arrives, so memory
+    stays flat however long the range is.
+    """
+    cmd = ["git", "log", "-z", *args, LOG_FORMAT]
+    with trace_span(" ".join(cmd), "git") as span:
+        proc = subprocess.Popen(cmd, cwd=str(REPO), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                stdin=subprocess.PIPE if stdin_lines is not None else subprocess.DEVNULL)
+        if stdin_lines is not None:
+            def feed():
+                with suppress(OSError):
+                    proc.stdin.write(("\n".join(stdin_lines) + "\n").encode("ascii"))
+                    proc.stdin.close()
+            threading.Thread(target=feed, name="log-stdin", daemon=True).start()
+        count, pending = 0, b""
+        try:
+            for chunk in iter(lambda: proc.stdout.read(1 << 16), b""):
+                *complete, pending = (pending + chunk).split(b"\0")
+                for raw in complete:
+                    record = parse_commit(raw)
+                    if record:
+                        count += 1
+                        yield record
+            record = parse_commit(pending) if pending.strip() else None
+            if record:
+                count += 1
+                yield record
+        finally:
+            if proc.poll() is None and not proc.stdout.closed:
+                # The consumer stopped early
+                proc.kill()
+            proc.stdout.close()
+            span.update(exit_code=proc.wait(), commits=count)
+
+def iter_commits(since_ref: str) -> Iterator[CommitRecord]:
+    """since..HEAD, newest first, no merges."""
+    return iter_log([f"{since_ref}..HEAD", "--no-merges"])
+
+def iter_commits_cached(since_ref: str, cache: CommitCache) -> Iterator[CommitRecord]:
+    """
+    Like iter_commits(), but only commits the cache has not seen are read and parsed: the range
+    is listed with `git rev-list` and looked up CACHE_WINDOW hashes at a time; each window's
+    misses come from one `git log --no-walk --stdin` and are added to the cache.
+    """
+    cmd = ["git", "rev-list", "--no-merges", f"{since_ref}..HEAD"]
+    with trace_span(" ".join(cmd), "git") as span:
+        proc = subprocess.Popen(cmd, cwd=str(REPO), stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+        try:
+            window: List[str] = []
+            for line in proc.stdout:
+                window.append(line.strip())
+                if len(window) >= CACHE_WINDOW:
+                    yield from cache.resolve(window)
+                    window = []
+            if window:
+                yield from cache.resolve(window)
+        finally:
+            if proc.poll() is None:
+                proc.kill()
+            proc.stdout.close()
+            span.update(exit_code=proc.wait(), cache_hits=cache.hits, cache_misses=cache.misses)
+
+def diff_numstat(since_ref: str) -> Dict[str, Tuple[int, int]]:
+    """{path: (insertions, deletions)} between since and HEAD; binary files count as (0, 0)."""
+    rc, out, _ = run(["git", "diff", "--numstat", "-z", f"{since_ref}..HEAD"], check=False)
+    stats: Dict[str, Tuple[int, int]] = {}
+    if rc != 0:
+        return stats
+    fields = out.split("\0")
+    i = 0
+    while i < len(fields):
+        added, _, rest = fields[i].partition("\t")
+        deleted, _, path = rest.partition("\t")
+        i += 1
+        if not added:
+            continue
+        if not path:
+            # Rename/copy: "added\tdeleted\t" NUL old NUL new
+            path = fields[i + 1] if i + 1 < len(fields) else ""
+            i += 2
+        stats[path] = (int(added) if added.isdigit() else 0, int(deleted) if deleted.isdigit() else 0)
+    return stats
+
+@dataclass(frozen=True)
+class BucketRules:
+    """
+    How commits are sorted into note sections: a lookup table from commit type to bucket,
+    the section order, and the buckets that get one sub-section per scope.
+    """
+    types: Dict[str, str]                               # lower-case commit type -> bucket
+    order: Tuple[str, ...]                              # sections, breaking first and other last
+    by_scope: FrozenSet[str] = frozenset()              # buckets split by scope
+    scopes: Dict[str, str] = field(default_factory=dict)  # lower-case scope -> group name
+    other: str = OTHER_BUCKET
+    breaking: str = BREAKING_BUCKET
+
+    def digest(self) -> str:
+        """Identifies these rules in the commit cache; any change reclassifies cached commits."""
+        return text_digest(json.dumps([sorted(self.types.items()), self.order, sorted(self.by_scope),
+                                       sorted(self.scopes.items()), self.other, self.breaking]))
+
+    def classify(self, subject: str) -> Tuple[str, str, bool]:
+        """(bucket, scope group or "", `!` marker) from a single match of the header."""
+        m = HEADER_RE.match(subject)
+        if not m:
+            return self.other, "", False
+        kind, scope, bang = m.groups()
+        bucket = self.types.get(kind.lower(), self.other)
+        if scope and bucket in self.by_scope:
+            scope = scope.strip().lower()
+            return bucket, self.scopes.get(scope, scope), bang is not None
+        return bucket, "", bang is not None
+
+def load_bucket_rules(path: Optional[Path] = None, required: bool = False) -> BucketRules:
+    """
+    Bucket rules from a JSON file, or the built-in DEFAULT_BUCKETS when there is none.
+
+    {"buckets": [{"name": "Features", "types": ["feat", "feature"], "group_by_scope": true}, ...],
+     "scopes": {"frontend": "ui", "web": "ui"}, "other": "Other", "breaking": "Breaking Changes"}
+
+    Buckets are listed in changelog order. Commits whose type is not listed go to "other";
+    "scopes" merges scope aliases into one group in buckets with "group_by_scope".
+    """
+    data: dict = {}
+    if path is not None and path.exists():
+        data = json.loads(path.read_text(encoding="utf-8"))
+        if not isinstance(data, dict):
+            raise ValueError(f"{path}: expected a JSON object")
+    elif required:
+        raise ValueError(f"bucket file not found: {path}")
+    entries = data.get("buckets")
+    if entries is None:
+        entries = [{"name": name, "types": list(kinds)} for name, kinds in DEFAULT_BUCKETS]
+    other = str(data.get("other", OTHER_BUCKET))
+    breaking = str(data.get("breaking", BREAKING_BUCKET))
+    types: Dict[str, str] = {}
+    order: List[str] = []
+    by_scope = set()
+    for entry in entries:
+        name = entry.get("name") if isinstance(entry, dict) else None
+        kinds = entry.get("types") if isinstance(entry, dict) else None
+        if not name or not isinstance(kinds, list) or not kinds:
+            raise ValueError(f"{path}: every bucket needs a 'name' and a non-empty 'types' list")
+        if name in (other, breaking) or name in order:
+            raise ValueError(f"{path}: bucket '{name}' is listed twice")
+        for kind in kinds:
+            kind = str(kind).lower()
+            if kind in types:
+                raise ValueError(f"{path}: type '{kind}' is in both '{types[kind]}' and '{name}'")
+            types[kind] = name
+        order.append(name)
+        if entry.get("group_by_scope"):
+            by_scope.add(name)
+    scopes = {str(k).lower(): str(v) for k, v in (data.get("scopes") or {}).items()}
+    return BucketRules(types=types, order=(breaking, *order, other), by_scope=frozenset(by_scope),
+                       scopes=scopes, other=other, breaking=breaking)
+
+def bucketize(commits: Iterable[CommitRecord], rules: BucketRules) -> Dict[str, Dict[str, List[str]]]:
+    """{bucket: {scope group or "": note lines}}; breaking commits are also listed under rules.breaking."""
+    buckets: Dict[str, Dict[str, List[str]]] = {}
+    for commit in commits:
+        subject = commit.subject
+        bucket, scope, bang = commit.header or rules.classify(subject)
+        breaking = commit.breaking_footer() or (subject if bang else None)
+        if breaking:
+            buckets.setdefault(rules.breaking, {}).setdefault("", []).append(
+                f"- {breaking} ({commit.author}, {commit.short})")
+        buckets.setdefault(bucket, {}).setdefault(scope, []).append(f"- {subject} ({commit.author}, {commit.short})")
+    return buckets
+
+# ---- per-commit cache: parsed messages and their buckets under .git, keyed by full hash ----
+COMMIT_CACHE = "commit-release-cache.sqlite"
+# Bump whenever parsing (split_message, trailers, iter_log fields) or the table layout changes;
+# rows written under another version are dropped, since their subject/body/trailers are stale
+COMMIT_CACHE_VERSION = 2
+COMMIT_CACHE_MAX = 50000     # commits kept; the least recently used beyond this are evicted
+RANGE_CACHE_MAX = 20         # endpoint numstats kept
+CACHE_WINDOW = 2000          # hashes looked up (and misses read from git) per batch
+CACHE_USED_GRANULARITY = 3600  # seconds; a row's last-used time is refreshed at most this often
+
+class CommitCache:
+    """
+    sqlite cache of parsed commits and their classification, keyed by full hash. A row classified
+    under different BucketRules (see BucketRules.digest) is reclassified from its cached subject.
+    The database's user_version holds COMMIT_CACHE_VERSION; on a mismatch every cached commit is
+    dropped and read from git again. Endpoint numstats are cached too, keyed by the resolved
+    since..HEAD pair.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS commits (
+            hash TEXT PRIMARY KEY, short TEXT, author TEXT, subject TEXT, body TEXT, trailers TEXT,
+            rules TEXT, bucket TEXT, scope TEXT, bang INTEGER, used INTEGER);
+        CREATE INDEX IF NOT EXISTS commits_used ON commits (used);
+        CREATE TABLE IF NOT EXISTS ranges (key TEXT PRIMARY KEY, numstat TEXT, used INTEGER);
+    """
+
+    def __init__(self, path: Path, rules: BucketRules):
+        self.db = sqlite3.connect(str(path))
+        self.db.executescript(self.SCHEMA)
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != COMMIT_CACHE_VERSION:
+            # Parsed by another version of the message parser
+            with self.db:
+                self.db.execute("DELETE FROM commits")
+                self.db.execute(f"PRAGMA user_version = {COMMIT_CACHE_VERSION}")
+        self.rules = rules
+        self.rules_digest = rules.digest()
+        self.now = int(time.time())
+        self.hits = self.misses = 0
+
+    def lookup(self, hashes: List[str]) -> Dict[str, CommitRecord]:
+        found: Dict[str, CommitRecord] = {}
+        touched, stale = [], []
+        for i in range(0, len(hashes), 500):     # stay under sqlite's bound-variable limit
+            part = hashes[i:i + 500]
+            rows = self.db.execute(
+                "SELECT hash, short, author, subject, body, trailers, rules, bucket, scope, bang, used "
+                f"FROM commits WHERE hash IN ({','.join('?' * len(part))})", part)
+            for full_hash, short, author, subject, body, trailers, rules, bucket, scope, bang, used in rows:
+                if rules == self.rules_digest:
+                    header = (bucket, scope, bool(bang))
+                else:
+                    header = self.rules.classify(subject)
+                    stale.append((self.rules_digest, *header, full_hash))
+                found[full_hash] = CommitRecord(short, full_hash, author, subject, body,
+                                                tuple(map(tuple, json.loads(trailers))) if trailers else (),
+                                                header)
+                if used < self.now - CACHE_USED_GRANULARITY:
+                    touched.append((self.now, full_hash))
+        if touched or stale:
+            with self.db:
+                self.db.executemany("UPDATE commits SET used = ? WHERE hash = ?", touched)
+                self.db.executemany("UPDATE commits SET rules = ?, bucket = ?, scope = ?, bang = ? WHERE hash = ?",
+                                    stale)
+        return found
+
+    def store(self, records: List[CommitRecord]):
+        rows = []
+        for r in records:
+            r.header = bucket, scope, bang = r.header or self.rules.classify(r.subject)
+            rows.append((r.full_hash, r.short, r.author, r.subject, r.body, json.dumps(r.trailers) if r.trailers else None,
+                         self.rules_digest, bucket, scope, int(bang), self.now))
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO commits VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def resolve(self, hashes: List[str]) -> List[CommitRecord]:
+        """Records for hashes in the given order, reading the cache misses from git."""
+        found = self.lookup(hashes)
+        misses = [h for h in hashes if h not in found]
+        self.hits += len(found)
+        self.misses += len(misses)
+        if misses:
+            fresh = list(iter_log(["--no-walk=unsorted", "--stdin"], stdin_lines=misses))
+            self.store(fresh)
+            found.update((r.full_hash, r) for r in fresh)
+        return [found[h] for h in hashes if h in found]
+
+    def numstat(self, key: str) -> Optional[Dict[str, Tuple[int, int]]]:
+        row = self.db.execute("SELECT numstat FROM ranges WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        with self.db:
+            self.db.execute("UPDATE ranges SET used = ? WHERE key = ?", (self.now, key))
+        return {path: (a, d) for path, (a, d) in json.loads(row[0]).items()}
+
+    def store_numstat(self, key: str, numstat: Dict[str, Tuple[int, int]]):
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO ranges VALUES (?, ?, ?)", (key, json.dumps(numstat), self.now))
+
+    def close(self):
+        """Evict the least recently used rows beyond the caps, then close."""
+        with self.db:
+            self.db.execute("DELETE FROM commits WHERE hash IN (SELECT hash FROM commits "
+                            "ORDER BY used DESC LIMIT -1 OFFSET ?)", (COMMIT_CACHE_MAX,))
+            self.db.execute("DELETE FROM ranges WHERE key IN (SELECT key FROM ranges "
+                            "ORDER BY used DESC LIMIT -1 OFFSET ?)", (RANGE_CACHE_MAX,))
+        self.db.close()
+
+def open_commit_cache(rules: BucketRules) -> Optional[CommitCache]:
+    """The repo's commit cache, or None (with a warning) if it cannot be opened."""
+    try:
+        return CommitCache(git_dir() / COMMIT_CACHE, rules)
+    except (sqlite3.Error, OSError, RuntimeError) as e:
+        print(f"⚠️  Commit cache unavailable ({e}); reading every commit.")
+        return None
+
+# (scope group or "" for ungrouped, note lines), ungrouped first then by scope
+BucketNotes = Tuple[Tuple[str, Tuple[str, ...]], ...]
+
+@dataclass(frozen=True)
+class ReleaseRange:
+    """
+    Everything the release reads about since..HEAD, collected once (see collect_release_range)
+    and shared by the notes, the AI prompt and the summary.
+    """
+    since: Optional[str]
+    commits: Tuple[CommitRecord, ...]                   # newest first, at most PROMPT_COMMITS
+    commit_count: int                                   # every commit in the range
+    buckets: Tuple[Tuple[str, BucketNotes], ...]        # (bucket name, notes by scope) in changelog order
+    files: Tuple[str, ...]                              # changed paths, most changed lines first
+    insertions: int = 0
+    deletions: int = 0
+    prompt_lines: Tuple[str, ...] = ()                  # prompt_line() of every commit, if asked for
+
+    @property
+    def shortstat(self) -> str:
+        """Like `git diff --shortstat`."""
+        n = len(self.files)
+        if not n:
+            return ""
+        parts = [f"{n} file{'s' if n != 1 else ''} changed"]
+        if self.insertions:
+            parts.append(f"{self.insertions} insertion{'s' if self.insertions != 1 else ''}(+)")
+        if self.deletions:
+            parts.append(f"{self.deletions} deletion{'s' if self.deletions != 1 else ''}(-)")
+        return ", ".join(parts)
+
+    def top_files(self, limit: int = 20) -> List[str]:
+        return list(self.files[:limit])
+
+    def notes(self) -> List[str]:
+        if not self.commit_count:
+            return ["No changes."]
+        lines: List[str] = []
+        for name, groups in self.buckets:
+            lines.append(f"### {name}")
+            for scope, items in groups:
+                if scope:
+                    lines += ["", f"#### {scope}"]
+                lines.extend(items)
+            lines.append("")
+        if lines and lines[-1] == "":
+            lines.pop()
+        return lines
+
+# Commits listed in the AI prompt (and kept as records on the ReleaseRange)
+PROMPT_COMMITS = 100
+
+def collect_release_range(since_ref: str, rules: BucketRules, cache: Optional[CommitCache] = None,
+                          keep_prompt_lines: bool = False) -> ReleaseRange:
+    """
+    Walk since..HEAD once: a streamed `git log` for the commits and, concurrently, one
+    `git diff --numstat` between the endpoints for the changed files and the shortstat.
+    Commits are bucketed as they stream in; only the newest PROMPT_COMMITS records are kept
+    (plus, with keep_prompt_lines, every commit's one-line prompt form for a map-reduce summary).
+    With a cache, only unseen commits are read and a repeated range reuses its numstat.
+    """
+    numstat: Dict[str, Tuple[int, int]] = {}
+    range_key = None
+    if cache:
+        _, ends, _ = run(["git", "rev-parse", f"{since_ref}^{{commit}}", "HEAD"])
+        range_key = "..".join(ends.split())
+        numstat = cache.numstat(range_key) or {}
+    differ = None
+    if not numstat:
+        differ = threading.Thread(target=lambda: numstat.update(diff_numstat(since_ref)), name="numstat")
+        differ.start()
+    kept: List[CommitRecord] = []
+    lines: List[str] = []
+    count = 0
+
+    def stream():
+        nonlocal count
+        for commit in (iter_commits_cached(since_ref, cache) if cache else iter_commits(since_ref)):
+            count += 1
+            if len(kept) < PROMPT_COMMITS:
+                kept.append(commit)
+            if keep_prompt_lines:
+                lines.append(prompt_line(commit))
+            yield commit
+
+    buckets = bucketize(stream(), rules)
+    if differ:
+        differ.join()
+        if cache and numstat:
+            cache.store_numstat(range_key, numstat)
+    files = sorted(numstat, key=lambda path: (-sum(numstat[path]), path))
+    return ReleaseRange(
+        since=since_ref,
+        commits=tuple(kept),
+        commit_count=count,
+        buckets=tuple((name, tuple((scope, tuple(buckets[name][scope])) for scope in sorted(buckets[name])))
+                      for name in rules.order if name in buckets),
+        files=tuple(files),
+        insertions=sum(a for a, _ in numstat.values()),
+        deletions=sum(d for _, d in numstat.values()),
+        prompt_lines=tuple(lines),
+    )
+
+# ---- case-resolving helpers for Windows/macOS ----
+def resolve_existing(path_candidates: List[str]) -> Path:
+    for name in path_candidates:
+        p = REPO / name
+        if p.exists():
+            return p
+    for name in path_candidates:
+        for child in REPO.iterdir():
+            if child.name.lower() == name.lower():
+                return child
+    return REPO / path_candidates[0]
+
+def paths_for_docs() -> Tuple[Path, Path]:
+    changelog = resolve_existing(["CHANGELOG.md", "Changelog.md", "changelog.md"])
+    readme    = resolve_existing(["README.md", "Readme.md", "readme.md"])
+    return changelog, readme
+
+# ---- segmented changelog: changelog.d/ fragments + index, changelog.md rendered from them ----
+CHANGELOG_DIR = "changelog.d"
+CHANGELOG_INDEX = "index.json"
+CHANGELOG_HEADER = "# Changelog"
+# Index layout: 2 = header and fragments stored byte-for-byte, each carrying its own trailing separator
+CHANGELOG_FORMAT = 2
+# Size/mtime at which changelog.md last matched the index's render record; a per-machine shortcut
+# that only saves re-hashing, so it lives under .git
+CHANGELOG_CHECK = "changelog-check.json"
+
+def text_digest(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+# os.umask() can only be read by setting it; do that once, before any threads start
+UMASK = os.umask(0o022)
+os.umask(UMASK)
+
+def replace_keeping_mode(tmp: str, path: Path):
+    """os.replace() tmp over path. mkstemp() creates 0600 files, so give tmp path's mode (or the umask default) first."""
+    try:
+        mode = stat.S_IMODE(os.stat(path).st_mode)
+    except FileNotFoundError:
+        mode = 0o666 & ~UMASK
+    os.chmod(tmp, mode)
+    os.replace(tmp, path)
+
+def atomic_write_text(path: Path, text: str):
+    """Write via a temp file in the same directory and os.replace(), so readers never see a partial file."""
+    fd, tmp = tempfile.mkstemp(dir=str(path.parent), prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(text)
+        replace_keeping_mode(tmp, path)
+    except BaseException:
+        with suppress(OSError):
+            os.unlink(tmp)
+        raise
+
+class DocWriter:
+    """
+    Writes the generated docs. A file is replaced atomically and only when the new content's
+    hash differs from what is on disk; touched/removed list exactly what changed, for staging.
+    """
+
+    def __init__(self):
+        self.touched: List[Path] = []
+        self.removed: List[Path] = []
+
+    def unchanged(self, path: Path, text: str) -> bool:
+        try:
+            return text_digest(path.read_text(encoding="utf-8")) == text_digest(text)
+        except (OSError, UnicodeDecodeError):
+            return False
+
+    def write(self, path: Path, text: str) -> bool:
+        """Write text to path unless it already holds it; True if the file changed."""
+        if self.unchanged(path, text):
+            return False
+        atomic_write_text(path, text)
+        self.wrote(path)
+        return True
+
+    def wrote(self, path: Path):
+        """Record a file written some other way (e.g. streamed)."""
+        if path not in self.touched:
+            self.touched.append(path)
+
+    def remove(self, path: Path):
+        path.unlink()
+        self.removed.append(path)
+
+class ChangelogStore:
+    """
+    changelog.d/ holds one Markdown fragment per release and index.json lists them (oldest first)
+    with their hashes. changelog.md is the header followed by the fragments, newest first; each
+    fragment keeps its own trailing blank lines, so importing an existing changelog.md and rendering
+    it again gives the same text. A release writes one fragment and the small index; changelog.md
+    is then streamed from the fragments into a temp file and swapped in.
+
+    The index records the last render (fragment digest, output hash and size), so the record is
+    versioned with changelog.md and holds on any clone. If changelog.md no longer matches it (edited
+    by hand), or the store does not exist yet, its sections are imported back into fragments first.
+    """
+
+    def __init__(self, changelog_path: Path, docs: DocWriter):
+        self.target = changelog_path
+        self.docs = docs
+        self.root = changelog_path.parent / CHANGELOG_DIR
+        self.index_path = self.root / CHANGELOG_INDEX
+        self.check_path = git_dir() / CHANGELOG_CHECK
+        self.index = self._load_index()
+
+    def _load_index(self) -> dict:
+        try:
+            index = json.loads(self.index_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return self._import(*self._read_target())
+        if index.get("format") != CHANGELOG_FORMAT:
+            # Older layout (header and fragments stripped, blank lines added between them)
+            return self._import(*(self._read_target() if self.target.exists() else (self._legacy_text(index), "\n")))
+        if self.target.exists() and not self._is_rendered(index):
+            return self._import(*self._read_target())
+        return index
+
+    def _read_target(self) -> Tuple[str, str]:
+        """(text with LF line endings, the file's newline) of changelog.md; ("", LF) if it does not exist."""
+        if not self.target.exists():
+            return "", "\n"
+        with open(self.target, "r", encoding="utf-8", newline="") as f:
+            raw = f.read()
+        return raw.replace("\r\n", "\n"), "\r\n" if "\r\n" in raw else "\n"
+
+    def _legacy_text(self, index: dict) -> str:
+        try:
+            return index["header"] + "\n" + "".join(
+                "\n" + (self.root / f["file"]).read_text(encoding="utf-8") for f in reversed(index["fragments"]))
+        except (OSError, KeyError):
+            return ""
+
+    def _is_rendered(self, index: dict) -> bool:
+        """True if changelog.md is exactly what the fragments render to; hashes it only when size/mtime moved."""
+        rendered = index.get("rendered") or {}
+        st = self.target.stat()
+        if rendered.get("fragments") == self.digest(index) and rendered.get("size") == st.st_size:
+            try:
+                check = json.loads(self.check_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                check = {}
+            if check == {"sha256": rendered.get("sha256"), "size": st.st_size, "mtime_ns": st.st_mtime_ns}:
+                return True
+        current = text_digest(self._read_target()[0])
+        if rendered.get("fragments") != self.digest(index) or rendered.get("sha256") != current:
+            # No usable record (or fragments changed since): compare with a fresh render
+            try:
+                h = hashlib.sha256()
+                for chunk in self._chunks(index):
+                    h.update(chunk.encode("utf-8"))
+            except OSError:
+                return False
+            if h.hexdigest() != current:
+                return False
+        self._save_check(current)
+        return True
+
+    def _save_check(self, sha256: str):
+        st = self.target.stat()
+        with suppress(OSError):
+            atomic_write_text(self.check_path, json.dumps(
+                {"sha256": sha256, "size": st.st_size, "mtime_ns": st.st_mtime_ns}) + "\n")
+
+    @staticmethod
+    def _fragment_name(seq: int, title: str) -> str:
+        slug = re.sub(r"[^A-Za-z0-9._-]+", "-", title).strip("-.")[:40]
+        return f"{seq:05d}-{slug or 'release'}.md"
+
+    def _write_fragment(self, name: str, text: str) -> str:
+        self.docs.write(self.root / name, text)
+        return text_digest(text)
+
+    def _import(self, existing: str, newline: str = "\n") -> dict:
+        """Split a changelog.md into its header and "## " sections (newest first in the file), byte-for-byte."""
+        header = ""
+        sections: List[str] = []
+        for line in existing.splitlines(keepends=True):
+            if line.startswith("## "):
+                sections.append(line)
+            elif sections:
+                sections[-1] += line
+            else:
+                header += line
+        if not existing:
+            header = CHANGELOG_HEADER + "\n\n"
+        self.root.mkdir(exist_ok=True)
+        fragments = []
+        for seq, text in enumerate(reversed(sections), 1):
+            title = text.splitlines()[0][3:].strip()
+            name = self._fragment_name(seq, title)
+            fragments.append({"file": name, "title": title, "sha256": self._write_fragment(name, text)})
+        keep = {f["file"] for f in fragments} | {CHANGELOG_INDEX}
+        for stale in self.root.glob("*.md"):
+            if stale.name not in keep:
+                self.docs.remove(stale)
+        index = {"format": CHANGELOG_FORMAT, "header": header, "newline": newline,
+                 "next": len(fragments) + 1, "fragments": fragments}
+        # The imported text is what these fragments render to
+        index["rendered"] = {"fragments": self.digest(index), "sha256": text_digest(existing),
+                             "size": self.target.stat().st_size if existing and self.target.exists() else None}
+        self._save_index(index)
+        return index
+
+    def _save_index(self, index: dict):
+        self.root.mkdir(exist_ok=True)
+        self.docs.write(self.index_path, json.dumps(index, ensure_ascii=False, indent=1) + "\n")
+
+    def digest(self, index: Optional[dict] = None) -> str:
+        index = index or self.index
+        h = hashlib.sha256(index["header"].encode("utf-8"))
+        for fragment in index["fragments"]:
+            h.update(f"\0{fragment['file']}\0{fragment['sha256']}".encode("utf-8"))
+        return h.hexdigest()
+
+    def _chunks(self, index: dict):
+        # changelog.md as text pieces (LF): header, then each fragment newest first
+        yield index["header"]
+        for fragment in reversed(index["fragments"]):
+            with open(self.root / fragment["file"], "r", encoding="utf-8") as f:
+                yield f.read()
+
+    def add_release(self, section_title: str, notes: List[str], summary_block: Optional[List[str]] = None):
+        """Store one release section as the newest fragment (ending in a blank line if older ones follow)."""
+        lines = [f"## {section_title}", ""]
+        if summary_block:
+            lines += summary_block + [""]
+        lines += notes
+        text = "\n".join(lines).rstrip("\n") + "\n" + ("\n" if self.index["fragments"] else "")
+        seq = self.index["next"]
+        name = self._fragment_name(seq, section_title)
+        digest = self._write_fragment(name, text)
+        self.index["fragments"].append({"file": name, "title": section_title, "sha256": digest})
+        self.index["next"] = seq + 1
+        self._save_index(self.index)
+
+    def render(self) -> bool:
+        """Stream changelog.md from the fragments (newest first) unless it already shows this digest."""
+        digest = self.digest()
+        # _load_index() checked changelog.md against the recorded render (or re-imported it)
+        if (self.index.get("rendered") or {}).get("fragments") == digest and self.target.exists():
+            return False
+        h = hashlib.sha256()
+        fd, tmp = tempfile.mkstemp(dir=str(self.target.parent), prefix=f".{self.target.name}.", suffix=".tmp")
+        try:
+            # Keep the file's line endings (a CRLF changelog stays CRLF)
+            with os.fdopen(fd, "w", encoding="utf-8", newline=self.index.get("newline", "\n")) as out:
+                for chunk in self._chunks(self.index):
+                    out.write(chunk)
+                    h.update(chunk.encode("utf-8"))
+            replace_keeping_mode(tmp, self.target)
+        except BaseException:
+            with suppress(OSError):
+                os.unlink(tmp)
+            raise
+        self.docs.wrote(self.target)
+        self.index["rendered"] = {"fragments": digest, "sha256": h.hexdigest(), "size": self.target.stat().st_size}
+        self._save_index(self.index)
+        self._save_check(h.hexdigest())
+        return True
+
+def update_readme_latest(readme_path: Path, notes: List[str], docs: DocWriter,
+                         summary_block: Optional[List[str]] = None) -> bool:
+    """Replace the LATEST-CHANGES block (appending it on first use); True if the README changed."""
+    existing = readme_path.read_text(encoding="utf-8") if readme_path.exists() else ""
+    body_lines: List[str] = []
+    if summary_block:
+        body_lines += ["### Summary"] + summary_block + [""]
+    body_lines += notes
+    block = f"{LATEST_START}\n" + "\n".join(body_lines) + f"\n{LATEST_END}"
+
+    if LATEST_START in existing and LATEST_END in existing:
+        pre, rest = existing.split(LATEST_START, 1)
+        old_block, post = rest.split(LATEST_END, 1)
+        if text_digest(LATEST_START + old_block + LATEST_END) == text_digest(block):
+            return False
+        new_body = pre + block + post
+    else:
+        new_body = existing + "\n## Latest changes\n\n" + block + "\n"
+
+    return docs.write(readme_path, new_body)
+
+def read_package_version() -> Optional[str]:
+    if not PKG_JSON.exists():
+        return None
+    try:
+        data = json.loads(PKG_JSON.read_text(encoding="utf-8"))
+        return str(data.get("version")) if "version" in data else None
+    except Exception:
+        return None
+
+def bump_semver(ver: str, kind: str) -> str:
     try:
-        run(["git", "add", "-A"], check=False)
+        major, minor, patch = [int(x) for x in ver.split(".")]
     except Exception:
-        pass
-    committed = git_commit(commit_msg)
-
-    # Tag (only if we actually committed and bumped)
-    if committed and args.tag and bumped:
-        tag_name = f"v{bumped}"
-        git_tag(tag_name)
-        print(f"Tagged {tag_name}")
-
-    # ------- Optional push via sync_repos.py --------
-    wants_private = args.push or args.push_private
-    wants_public  = args.push or args.push_public
-
-    def call_sync(push_private: bool, push_public: bool):
-        sync = Path(args.sync_script)
-        if not sync.exists():
-            print(f"⚠️  Skipping push: sync script not found at {sync}")
-            return
-        cmd = [
-            sys.executable, str(sync),
-            "--private-remote", args.private-remote if False else args.private_remote,  # keep mypy quiet
-            "--public-remote",  args.public_remote,
-            "--public-branch",  args.public_branch,
-            "--public-mode",    args.public_mode,
-        ]
-        if args.sync_verbose:
-            cmd.append("--verbose")
-        # We *always* want to push private full history after a release commit;
-        # push_public is controlled by flags, but sync_repos handles both as one run.
-        # If you only want one or the other, we still call sync once and let modes decide:
-        # - private push always occurs (full history)
-        # - public update obeys chosen mode
-        # To support "only private" or "only public", we can add flags to sync_repos later.
-        # For now, we run it once either way; if you truly want only one, use sync_repos directly.
-        try:
-            print("→ Running sync_repos.py …")
-            res = subprocess.run(cmd, text=True)
-            if res.returncode != 0:
-                print("⚠️  sync_repos.py returned a non-zero exit code.")
-        except Exception as e:
-            print(f"⚠️  Failed to run sync_repos.py: {e}")
-
-    if wants_private or wants_public:
-        call_sync(wants_private, wants_public)
-
-    # ------------------------------------------------
-
-    print("✅ Done.")
-    if unborn:
-        print("   • Repo had no commits; wrote initial entries.")
-    else:
-        print("   • Changelog/README updated from recent commits.")
-    if summary_lines:
-        print("   • AI summary added.")
-    if bumped:
-        print(f"   • package.json bumped to {bumped}{' and tagged' if args.tag and committed else ''}.")
-    if not committed:
-        print("   • No changes detected after generation; nothing committed.")
-
-if __name__ == "__main__":
-    try:
-        main()
-    except Exception as e:
-        sys.exit(f"\n❌ Error: {e}\n")
+        raise ValueError(f"package.json version '{ver}' is not MAJOR.MINOR.PATCH")
+    if kind == "major":
+        return f"{major+1}.0.0"
+    if kind == "minor":
+        return f"{major}.{minor+1}.0"
+    if kind == "patch":
+        return f"{major}.{minor}.{patch+1}"
+    return ver
+
+def write_package_version(new_ver: str, docs: DocWriter):
+    data = json.loads(PKG_JSON.read_text(encoding="utf-8"))
+    data["version"] = new_ver
+    docs.write(PKG_JSON, json.dumps(data, ensure_ascii=False, indent=2) + "\n")
+
+def git_add(paths: List[Path]):
+    if paths:
+        run(["git", "add", "--"] + [str(p) for p in dict.fromkeys(paths)])
+
+def git_rm_cached(paths: List[Path]):
+    if paths:
+        run(["git", "rm", "--cached", "--quiet", "--ignore-unmatch", "--"] + [str(p) for p in paths])
+
+def git_commit(message: str) -> bool:
+    rc, _, _ = run(["git", "diff", "--cached", "--quiet"], check=False)
+    if rc == 0:
+        return False
+    run(["git", "commit", "-m", message])
+    return True
+
+def git_tag(tag: str):
+    run(["git", "tag", tag])
+
+# ---------- AI summary (OpenAI-compatible) ----------
+def resolve_ai_defaults(args) -> Tuple[str, str, str]:
+    model = args.summary_model or os.environ.get("OPENAI_SUMMARY_MODEL", "gpt-5")
+    base = args.summary_base_url or os.environ.get("OPENAI_BASE_URL", "https://api.openai.com/v1")
+    key = args.summary_api_key or os.environ.get("OPENAI_API_KEY") or ""
+    if not key:
+        key = os.environ.get("OPENROUTER_API_KEY", "")
+        if key and not args.summary_base_url:
+            base = "https://openrouter.ai/api/v1"
+    if not key:
+        key = os.environ.get("GROQ_API_KEY", "")
+        if key and not args.summary_base_url:
+            base = "https://api.groq.com/openai/v1"
+    if not key:
+        key = os.environ.get("AZURE_OPENAI_API_KEY", "")
+    if not key:
+        key = os.environ.get("OLLAMA_API_KEY", "ollama")
+        if not args.summary_base_url:
+            base = "http://localhost:11434/v1"
+    return model, base, key
+
+@dataclass(frozen=True)
+class AIProvider:
+    name: str
+    base_url: str
+    api_key: str
+    model: str
+
+# Providers that --summary-fallback-env adds to the chain: (name, key variable, base URL, model
+# variable). A fallback needs its own model variable, since model names differ between providers.
+FALLBACK_PROVIDERS = [
+    ("openai",     "OPENAI_API_KEY",     "https://api.openai.com/v1",      "OPENAI_SUMMARY_MODEL"),
+    ("openrouter", "OPENROUTER_API_KEY", "https://openrouter.ai/api/v1",   "OPENROUTER_SUMMARY_MODEL"),
+    ("groq",       "GROQ_API_KEY",       "https://api.groq.com/openai/v1", "GROQ_SUMMARY_MODEL"),
+    ("ollama",     "OLLAMA_API_KEY",     "http://localhost:11434/v1",      "OLLAMA_SUMMARY_MODEL"),
+]
+
+def resolve_ai_providers(args) -> List[AIProvider]:
+    """
+    The primary provider from resolve_ai_defaults(), then each --summary-fallback URL (same model
+    and key). Only with --summary-fallback-env, then every provider in FALLBACK_PROVIDERS whose key
+    and model variables are both set; prompts never go to an endpoint that was not asked for.
+    """
+    model, base, key = resolve_ai_defaults(args)
+    chain = [AIProvider(urlsplit(base).netloc or base, base, key, model)]
+    for url in args.summary_fallback or []:
+        chain.append(AIProvider(urlsplit(url).netloc or url, url, key, model))
+    for name, key_var, url, model_var in FALLBACK_PROVIDERS if args.summary_fallback_env else ():
+        if os.environ.get(key_var) and os.environ.get(model_var):
+            chain.append(AIProvider(name, url, os.environ[key_var], os.environ[model_var]))
+    unique: Dict[Tuple[str, str], AIProvider] = {}
+    for provider in chain:
+        unique.setdefault((provider.base_url.rstrip("/"), provider.model), provider)
+    return list(unique.values())
+
+class RequestCancelled(Exception):
+    """The request lost a hedge race (see hedged_completion)."""
+
+class CancelToken:
+    """Set by the winner of a hedged request; shuts down the losers' sockets so blocked reads return."""
+
+    def __init__(self):
+        self.event = threading.Event()
+        self._lock = threading.Lock()
+        self._conns: List[http.client.HTTPConnection] = []
+
+    def attach(self, conn: http.client.HTTPConnection):
+        with self._lock:
+            self._conns.append(conn)
+        if self.event.is_set():
+            self._shutdown(conn)
+
+    def detach(self, conn: http.client.HTTPConnection):
+        """The request on conn finished; leave the connection alone (it may go back to the pool)."""
+        with self._lock:
+            with suppress(ValueError):
+                self._conns.remove(conn)
+
+    def cancel(self):
+        self.event.set()
+        with self._lock:
+            conns = list(self._conns)
+        for conn in conns:
+            self._shutdown(conn)
+
+    @staticmethod
+    def _shutdown(conn: http.client.HTTPConnection):
+        with suppress(OSError, AttributeError):
+            conn.sock.shutdown(socket.SHUT_RDWR)
+
+class ConnectionPool:
+    """
+    Idle keep-alive HTTP(S) connections per (scheme, host, port), reused by later AI requests
+    (map-reduce chunks, retries, the next hedge) instead of a new TCP and TLS handshake each.
+    """
+
+    def __init__(self, max_idle: int = 8):
+        self.max_idle = max_idle
+        self._idle: Dict[Tuple[str, str, int], List[http.client.HTTPConnection]] = {}
+        self._lock = threading.Lock()
+        self.opened = 0
+
+    def acquire(self, key: Tuple[str, str, int], timeout: float) -> Tuple[http.client.HTTPConnection, bool]:
+        """(connection, reused) for key; a reused connection may turn out to be closed by the server."""
+        with self._lock:
+            idle = self._idle.get(key)
+            if idle:
+                conn = idle.pop()
+                with suppress(OSError, AttributeError):
+                    conn.sock.settimeout(timeout)
+                return conn, True
+            self.opened += 1
+        scheme, host, port = key
+        cls = http.client.HTTPSConnection if scheme == "https" else http.client.HTTPConnection
+        return cls(host, port, timeout=timeout), False
+
+    def release(self, key: Tuple[str, str, int], conn: http.client.HTTPConnection):
+        with self._lock:
+            idle = self._idle.setdefault(key, [])
+            if len(idle) < self.max_idle:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close_all(self):
+        with self._lock:
+            conns = [c for idle in self._idle.values() for c in idle]
+            self._idle.clear()
+        for conn in conns:
+            conn.close()
+
+HTTP_POOL = ConnectionPool()
+
+def read_completion(content_type: str, readline: Callable[[], bytes], read_all: Callable[[], bytes],
+                    check: Callable[[], float]) -> str:
+    """The reply text from an SSE stream (assembled from the deltas) or a plain JSON body."""
+    if content_type != "text/event-stream":
+        return json.loads(read_all().decode("utf-8"))["choices"][0]["message"]["content"].strip()
+    parts: List[str] = []
+    for raw in iter(readline, b""):
+        check()
+        line = raw.decode("utf-8").strip()
+        if not line.startswith("data:"):
+            continue
+        chunk = line[5:].strip()
+        if chunk == "[DONE]":
+            break
+        for choice in json.loads(chunk).get("choices") or []:
+            parts.append((choice.get("delta") or {}).get("content") or "")
+    return "".join(parts).strip()
+
+def ai_chat_completion(model: str, base_url: str, api_key: str, system_msg: str, user_msg: str, max_tokens: int = 400,
+                       deadline: Optional[float] = None, cancel: Optional[CancelToken] = None) -> str:
+    """
+    One chat completion, streamed (SSE) and assembled as the deltas arrive. Servers that ignore
+    "stream" and answer with plain JSON are handled too. Raises TimeoutError once time.monotonic()
+    passes `deadline` (default: 60 s from now) and RequestCancelled once `cancel` is set.
+    Connections come from HTTP_POOL unless a proxy applies, in which case urllib handles it.
+    """
+    deadline = deadline if deadline is not None else time.monotonic() + 60
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": system_msg},
+            {"role": "user", "content": user_msg}
+        ],
+        "temperature": 0.3,
+        "max_tokens": max_tokens,
+        "stream": True
+    }
+    data = json.dumps(payload).encode("utf-8")
+    url = base_url.rstrip("/") + "/chat/completions"
+    headers = {"Content-Type": "application/json", "Accept": "text/event-stream",
+               "Authorization": f"Bearer {api_key}" if api_key else ""}
+
+    def remaining() -> float:
+        if cancel is not None and cancel.event.is_set():
+            raise RequestCancelled()
+        left = deadline - time.monotonic()
+        if left <= 0:
+            raise TimeoutError("summary latency budget spent")
+        return left
+
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or (parts.scheme in getproxies() and not proxy_bypass(parts.hostname or "")):
+        req = request.Request(url=url, data=data, method="POST", headers=headers)
+        with request.urlopen(req, timeout=remaining()) as resp:
+            return read_completion(resp.headers.get_content_type(), resp.readline, resp.read, remaining)
+
+    key = (parts.scheme, parts.hostname or "", parts.port or (443 if parts.scheme == "https" else 80))
+    path = parts.path + (f"?{parts.query}" if parts.query else "")
+    for attempt in range(2):
+        conn, reused = HTTP_POOL.acquire(key, remaining())
+        if cancel is not None:
+            cancel.attach(conn)
+        try:
+            conn.request("POST", path, body=data, headers=headers)
+            resp = conn.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+            conn.close()
+            if reused and attempt == 0:
+                continue    # the server dropped the idle connection; try once on a fresh one
+            raise
+        except BaseException:
+            conn.close()
+            raise
+        break
+    try:
+        if resp.status >= 400:
+            body = resp.read()
+            raise HTTPError(url, resp.status, resp.reason, resp.headers, io.BytesIO(body))
+        text = read_completion(resp.headers.get_content_type(), resp.readline, resp.read, remaining)
+        resp.read()     # drain the rest of the stream so the connection can be reused
+    except BaseException:
+        conn.close()
+        raise
+    if cancel is not None:
+        cancel.detach(conn)
+    if resp.will_close:
+        conn.close()
+    else:
+        HTTP_POOL.release(key, conn)
+    return text
+
+# Provider latency lives in its own database: it must survive --summary-cache-ttl 0
+PROVIDER_STATS = "commit-release-providers.sqlite"
+
+class ProviderStats:
+    """
+    Per-provider latency (exponentially weighted mean of successful requests) and failure counts,
+    kept in .git/commit-release-providers.sqlite (see open_provider_stats). order() puts the
+    fastest reliable provider first next run.
+    """
+    ALPHA = 0.3     # weight of the newest sample in the mean
+
+    def __init__(self, db: Optional[sqlite3.Connection] = None):
+        self.db = db
+        self._lock = threading.Lock()
+        self.rows: Dict[str, List[float]] = {}    # provider key -> [mean seconds, successes, failures]
+        self.session: Dict[str, List[float]] = {}  # this run's samples per provider name
+        if db is not None:
+            db.execute("CREATE TABLE IF NOT EXISTS provider_stats "
+                       "(key TEXT PRIMARY KEY, mean REAL, successes INTEGER, failures INTEGER)")
+            for key, mean, ok, failed in db.execute("SELECT key, mean, successes, failures FROM provider_stats"):
+                self.rows[key] = [mean, ok, failed]
+
+    @staticmethod
+    def key(p: AIProvider) -> str:
+        return f"{p.base_url.rstrip('/')} {p.model}"
+
+    def record(self, p: AIProvider, seconds: Optional[float]):
+        """A finished request: its latency, or None for a failure."""
+        with self._lock:
+            row = self.rows.setdefault(self.key(p), [0.0, 0, 0])
+            if seconds is None:
+                row[2] += 1
+                return
+            row[0] = seconds if not row[1] else (1 - self.ALPHA) * row[0] + self.ALPHA * seconds
+            row[1] += 1
+            self.session.setdefault(p.name, []).append(seconds)
+
+    def expected(self, p: AIProvider) -> Optional[float]:
+        row = self.rows.get(self.key(p))
+        return row[0] if row and row[1] else None
+
+    def order(self, providers: List[AIProvider]) -> List[AIProvider]:
+        """Fastest first; untried providers after measured ones, mostly-failing ones last (ties keep chain order)."""
+        def rank(item):
+            i, p = item
+            row = self.rows.get(self.key(p))
+            expected = self.expected(p)
+            unreliable = bool(row) and row[2] > max(2, row[1])
+            return (unreliable, expected is None, expected or 0.0, i)
+        return [p for _, p in sorted(enumerate(providers), key=rank)]
+
+    def close(self):
+        """Store the updated rows and close the database."""
+        if self.db is None:
+            return
+        with self._lock, self.db:
+            self.db.executemany("INSERT OR REPLACE INTO provider_stats VALUES (?, ?, ?, ?)",
+                                [(k, mean, ok, failed) for k, (mean, ok, failed) in self.rows.items()])
+        self.db.close()
+        self.db = None
+
+def open_provider_stats() -> ProviderStats:
+    try:
+        return ProviderStats(sqlite3.connect(str(git_dir() / PROVIDER_STATS)))
+    except (sqlite3.Error, OSError, RuntimeError) as e:
+        print(f"⚠️  Provider stats unavailable ({e}); using the configured order.")
+        return ProviderStats()
+
+def hedged_completion(providers: List[AIProvider], stats: ProviderStats, hedge_after: float,
+                      system_msg: str, user_msg: str, max_tokens: int, deadline: float) -> str:
+    """
+    Ask providers[0]; if it has not answered within hedge_after seconds (or fails), also ask the
+    next provider, and so on. The first successful reply wins and the other requests are cancelled.
+    """
+    cancel = CancelToken()
+    results: "queue.Queue[Tuple[AIProvider, Optional[str], Optional[Exception]]]" = queue.Queue()
+
+    def attempt(p: AIProvider):
+        started = time.monotonic()
+        try:
+            with trace_span(f"ai request {p.name}", "ai"):
+                text = ai_chat_completion(model=p.model, base_url=p.base_url, api_key=p.api_key,
+                                          system_msg=system_msg, user_msg=user_msg, max_tokens=max_tokens,
+                                          deadline=deadline, cancel=cancel)
+            stats.record(p, time.monotonic() - started)
+            results.put((p, text, None))
+        except Exception as e:
+            if not cancel.event.is_set():
+                stats.record(p, None)
+            results.put((p, None, e))
+
+    launched = pending = 0
+    last_error: Optional[Exception] = None
+
+    def launch():
+        nonlocal launched, pending
+        p = providers[launched]
+        threading.Thread(target=attempt, args=(p,), name=f"ai-{p.name}", daemon=True).start()
+        launched += 1
+        pending += 1
+
+    launch()
+    try:
+        while True:
+            wait = deadline - time.monotonic()
+            if launched < len(providers):
+                wait = min(wait, hedge_after)
+            try:
+                p, text, error = results.get(timeout=max(0.0, wait))
+            except queue.Empty:
+                if time.monotonic() >= deadline:
+                    raise TimeoutError("summary latency budget spent")
+                launch()    # the leader is slow: hedge with the next provider
+                continue
+            pending -= 1
+            if error is None:
+                return text
+            last_error = error
+            if launched < len(providers):
+                launch()    # fail over at once
+            elif not pending:
+                raise last_error
+    finally:
+        cancel.cancel()
+
+# ---- summary cache: responses keyed by a hash of everything that shapes them ----
+SUMMARY_CACHE = "commit-release-summaries.sqlite"
+SUMMARY_CACHE_MAX = 200      # summaries kept; the least recently used beyond this are evicted
+
+class SummaryCache:
+    """
+    sqlite cache of AI summaries under .git, keyed by summary_key(). Entries older than the TTL
+    are ignored (and dropped on close), so a rerun after a failed push or an amend is instant
+    while a stale summary is never reused for long.
+    """
+
+    def __init__(self, path: Path, ttl: float):
+        self.db = sqlite3.connect(str(path))
+        self.db.execute("CREATE TABLE IF NOT EXISTS summaries "
+                        "(key TEXT PRIMARY KEY, summary TEXT, created REAL, used REAL)")
+        self.ttl = ttl
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        row = self.db.execute("SELECT summary FROM summaries WHERE key = ? AND created >= ?",
+                              (key, now - self.ttl)).fetchone()
+        if row is None:
+            return None
+        with self.db:
+            self.db.execute("UPDATE summaries SET used = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def put(self, key: str, summary: str):
+        now = time.time()
+        with self.db:
+            self.db.execute("INSERT OR REPLACE INTO summaries VALUES (?, ?, ?, ?)", (key, summary, now, now))
+
+    def close(self):
+        with self.db:
+            self.db.execute("DELETE FROM summaries WHERE created < ?", (time.time() - self.ttl,))
+            self.db.execute("DELETE FROM summaries WHERE key IN (SELECT key FROM summaries "
+                            "ORDER BY used DESC LIMIT -1 OFFSET ?)", (SUMMARY_CACHE_MAX,))
+        self.db.close()
+
+def summary_key(model: str, base_url: str, system_msg: str, user_msg: str, max_tokens: int) -> str:
+    return text_digest(json.dumps([model, base_url.rstrip("/"), system_msg, user_msg, max_tokens]))
+
+def open_summary_cache(ttl_hours: float) -> Optional[SummaryCache]:
+    if ttl_hours <= 0:
+        return None
+    try:
+        return SummaryCache(git_dir() / SUMMARY_CACHE, ttl_hours * 3600)
+    except (sqlite3.Error, OSError, RuntimeError) as e:
+        print(f"⚠️  Summary cache unavailable ({e}); asking the model.")
+        return None
+
+SUMMARY_SYSTEM = (
+    "You are a precise release-notes writer. Produce a terse, executive summary for developers and PMs. "
+    "Focus on capabilities, fixes, and potential user-visible changes. Avoid marketing fluff."
+)
+SUMMARY_INSTRUCTIONS = (
+    "Write 3–6 bullet points. Each bullet should be one sentence and start with an action verb. "
+    "If there are breaking changes, include a final bullet starting with 'BREAKING:'. Do not invent details."
+)
+
+def prompt_line(c: CommitRecord) -> str:
+    return (f"- {c.subject} ({c.author})"
+            + ("" if not c.breaking else " [BREAKING]" if c.breaking == c.subject else f" [BREAKING: {c.breaking}]"))
+
+def prompt_header(repo_name: str, branch: str, release: ReleaseRange) -> str:
+    return (
+        f"Repository: {repo_name}\n"
+        f"Branch: {branch}\n"
+        f"Range start: {release.since or 'N/A (initial)'}\n"
+        f"Changes shortstat: {release.shortstat or 'n/a'}\n\n"
+    )
+
+def build_summary_prompt(repo_name: str, branch: str, release: ReleaseRange) -> Tuple[str, str]:
+    commit_lines = "\n".join(prompt_line(c) for c in release.commits[:PROMPT_COMMITS])
+    files_lines = "\n".join(f"- {f}" for f in release.top_files(30))
+    user_msg = (
+        prompt_header(repo_name, branch, release)
+        + f"Top changed files:\n{files_lines or '- n/a'}\n\n"
+        + f"Commit subjects:\n{commit_lines or '- Initial release'}\n\n"
+        + SUMMARY_INSTRUCTIONS
+    )
+    return SUMMARY_SYSTEM, user_msg
+
+# ---- map-reduce summary for ranges that do not fit one prompt ----
+MAP_SYSTEM = (
+    "You are a precise release-notes writer. You see one slice of a larger release. "
+    "Summarize only what this slice shows, as terse bullets; keep every breaking change as a bullet "
+    "starting with 'BREAKING:'. Do not invent details."
+)
+MAP_INSTRUCTIONS = "Write up to 6 bullet points, one sentence each, starting with an action verb."
+SUMMARY_RETRIES = 2          # extra attempts per chunk request after a transient failure
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token); no tokenizer needed."""
+    return len(text) // 4 + 1
+
+def pack_chunks(lines: Iterable[str], budget: int) -> List[List[str]]:
+    """Group lines, in order, into chunks of at most `budget` estimated tokens (a longer line stands alone)."""
+    chunks: List[List[str]] = []
+    current: List[str] = []
+    used = 0
+    for line in lines:
+        cost = estimate_tokens(line)
+        if current and used + cost > budget:
+            chunks.append(current)
+            current, used = [], 0
+        current.append(line)
+        used += cost
+    if current:
+        chunks.append(current)
+    return chunks
+
+def summary_chunks(release: ReleaseRange, budget: int) -> List[str]:
+    """
+    Every commit and changed file of the range as map prompts of about `budget` tokens each.
+    The commit lines come from the release walk (collect_release_range with keep_prompt_lines).
+    """
+    commits = pack_chunks(release.prompt_lines, budget)
+    files = pack_chunks((f"- {f}" for f in release.files), budget)
+    return ([f"Commit subjects (slice {i} of {len(commits)}):\n" + "\n".join(chunk)
+             for i, chunk in enumerate(commits, 1)]
+            + [f"Changed files (slice {i} of {len(files)}):\n" + "\n".join(chunk)
+               for i, chunk in enumerate(files, 1)])
+
+def is_transient_ai_error(e: Exception) -> bool:
+    if isinstance(e, HTTPError):
+        return e.code == 429 or e.code >= 500
+    return isinstance(e, (URLError, ConnectionError)) and not isinstance(e, TimeoutError)
+
+def ai_call_with_retries(call: Callable[[], str], deadline: float) -> str:
+    """call() with up to SUMMARY_RETRIES retries on transient errors, backing off within the deadline."""
+    for attempt in range(SUMMARY_RETRIES + 1):
+        try:
+            return call()
+        except Exception as e:
+            if attempt == SUMMARY_RETRIES or not is_transient_ai_error(e):
+                raise
+            step = min(8.0, 0.5 * (2 ** attempt))
+            delay = step / 2 + random.uniform(0, step / 2)
+            if time.monotonic() + delay >= deadline:
+                raise
+            time.sleep(delay)
+    raise AssertionError("unreachable")
+
+def map_reduce_summary(complete: Callable[[str, str], str], repo_name: str, branch: str, release: ReleaseRange,
+                       chunks: List[str], workers: int, budget: int, deadline: float) -> str:
+    """
+    Summarize every chunk on a pool of `workers` threads, merge the partial summaries in
+    budget-sized groups until they fit one prompt, then write the final summary from them.
+    complete(system, user) makes one (retried) request; any chunk that still fails fails the summary.
+    """
+    pool = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ai-map")
+
+    def run_all(system: str, prompts: List[str]) -> List[str]:
+        futures = [pool.submit(complete, system, p) for p in prompts]
+        try:
+            for future in as_completed(futures, timeout=max(0.0, deadline - time.monotonic())):
+                future.result()
+        except FuturesTimeout:
+            raise TimeoutError("summary latency budget spent")
+        return [f.result() for f in futures]
+
+    try:
+        with trace_span("ai map", "ai") as span:
+            partials = run_all(MAP_SYSTEM, [f"{chunk}\n\n{MAP_INSTRUCTIONS}" for chunk in chunks])
+            span.update(chunks=len(chunks), workers=workers)
+        while len(partials) > 1 and estimate_tokens("\n\n".join(partials)) > budget:
+            with trace_span("ai merge", "ai") as span:
+                groups = pack_chunks(partials, budget)
+                if len(groups) == len(partials):
+                    break   # each partial is already a chunk on its own; merging cannot shrink them
+                partials = run_all(MAP_SYSTEM, ["Partial summaries of consecutive slices:\n\n" + "\n\n".join(g)
+                                                + f"\n\n{MAP_INSTRUCTIONS}" for g in groups])
+                span.update(groups=len(groups))
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    user_msg = (
+        prompt_header(repo_name, branch, release)
+        + f"The release has {release.commit_count} commits and {len(release.files)} changed files. "
+        + "These partial summaries cover all of them:\n\n" + "\n\n".join(partials) + "\n\n"
+        + SUMMARY_INSTRUCTIONS
+    )
+    with trace_span("ai reduce", "ai"):
+        return complete(SUMMARY_SYSTEM, user_msg)
+
+def wants_map_reduce(args, release: ReleaseRange) -> bool:
+    if args.summary_mode != "auto":
+        return args.summary_mode == "map-reduce" and release.commit_count > 0
+    return release.commit_count > PROMPT_COMMITS or len(release.files) > 30
+
+class SummaryJob:
+    """
+    The AI summary on a background thread (cache lookup, then a streamed request), started as soon
+    as the release range is known so the version bump and doc preparation run meanwhile.
+    result() waits only until the --summary-budget deadline; after that the release goes on
+    without a summary and the request gives up at its next read.
+    """
+
+    def __init__(self, args, repo_name: str, branch: str, release: ReleaseRange):
+        self.args = args
+        self.deadline = time.monotonic() + args.summary_budget
+        self.lines: Optional[List[str]] = None
+        self.error: Optional[Exception] = None
+        self.thread = threading.Thread(target=self._run, args=(repo_name, branch, release),
+                                       name="ai-summary", daemon=True)
+        self.thread.start()
+
+    def _run(self, repo_name: str, branch: str, release: ReleaseRange):
+        args = self.args
+        try:
+            model, base, key = resolve_ai_defaults(args)
+            if not key and not (args.summary_base_url or "").startswith("http://localhost"):
+                raise RuntimeError("No API key found for remote provider.")
+
+            chunks: List[str] = []
+            if wants_map_reduce(args, release):
+                with trace_span("prepare summary chunks"):
+                    chunks = summary_chunks(release, args.summary_chunk_tokens)
+                sys_msg, user_msg = MAP_SYSTEM, "\0".join([prompt_header(repo_name, branch, release), *chunks])
+            else:
+                sys_msg, user_msg = build_summary_prompt(repo_name, branch, release)
+            cache_key = summary_key(model, base, sys_msg, user_msg, args.summary_max_tokens)
+            summaries = open_summary_cache(args.summary_cache_ttl)
+            stats = open_provider_stats()
+            providers = resolve_ai_providers(args)
+            if not args.summary_base_url:
+                # No explicit endpoint: lead with whichever provider has been fastest
+                providers = stats.order(providers)
+            hedge_after = args.summary_hedge_after
+            if hedge_after is None:
+                expected = stats.expected(providers[0])
+                hedge_after = min(15.0, max(1.0, 2 * expected)) if expected else 8.0
+
+            def complete(system: str, user: str) -> str:
+                return ai_call_with_retries(lambda: hedged_completion(
+                    providers, stats, hedge_after, system, user, args.summary_max_tokens, self.deadline),
+                    self.deadline)
+
+            try:
+                with trace_span("ai summary") as span:
+                    span.update(model=model, base_url=base, chunks=len(chunks),
+                                providers=[p.name for p in providers], hedge_after=hedge_after)
+                    summary = None if args.summary_refresh or not summaries else summaries.get(cache_key)
+                    span.update(cached=summary is not None)
+                    if summary is None:
+                        if chunks:
+                            summary = map_reduce_summary(complete, repo_name, branch, release, chunks,
+                                                         args.summary_workers, args.summary_chunk_tokens,
+                                                         self.deadline)
+                        else:
+                            summary = complete(sys_msg, user_msg)
+                        if summaries and summary:
+                            summaries.put(cache_key, summary)
+                    else:
+                        print("AI summary reused from cache (--summary-refresh to ask again).")
+                    span.update(latency={name: round(sum(v) / len(v), 3) for name, v in stats.session.items()},
+                                connections_opened=HTTP_POOL.opened)
+            finally:
+                stats.close()
+                if summaries:
+                    summaries.close()
+                HTTP_POOL.close_all()
+            if len(providers) > 1 and stats.session:
+                print("AI provider latency: " + ", ".join(
+                    f"{name} {sum(v) / len(v):.2f}s × {len(v)}" for name, v in stats.session.items()))
+            bullets = [ln.strip(" •-") for ln in summary.splitlines() if ln.strip()]
+            self.lines = [f"- {b}" for b in bullets[:8]] if bullets else [summary]
+        except Exception as e:
+            self.error = e
+
+    def result(self) -> Optional[List[str]]:
+        with trace_span("wait for ai summary"):
+            self.thread.join(max(0.0, self.deadline - time.monotonic()))
+        if self.thread.is_alive():
+            print(f"⚠️  Summary generation skipped: no answer within the {self.args.summary_budget:g}s budget.")
+            return None
+        if self.error is not None:
+            print(f"⚠️  Summary generation skipped: {self.error}")
+            return None
+        return self.lines
+
+# ---------- Args ----------
+def parse_args():
+    ap = argparse.ArgumentParser(description="Update CHANGELOG.md & README.md; optional AI summary, version bump, tag, and push.")
+    ap.add_argument("--bump", choices=["major", "minor", "patch", "none"], default="none", help="Semver bump in package.json")
+    ap.add_argument("--tag", action="store_true", help="Create a git tag after bump (vX.Y.Z)")
+    ap.add_argument("--since", help="Start ref (tag/hash). Default: last tag or root")
+    ap.add_argument("--allow-dirty", action="store_true", help="Skip clean worktree check")
+    ap.add_argument("--section-title", help="Changelog section title (default: YYYY-MM-DD)")
+    ap.add_argument("--no-commit-cache", action="store_true",
+                    help=f"Read and classify every commit instead of using .git/{COMMIT_CACHE}")
+    ap.add_argument("--buckets", metavar="FILE",
+                    help=f"JSON bucket definitions for the notes (default: {BUCKETS_FILE} if present, else built-in)")
+
+    # AI summary
+    ap.add_argument("--summarize", action="store_true", help="Generate an AI-written summary section")
+    ap.add_argument("--summary-model", help="OpenAI-compatible model name (default: env or 'gpt-5')")
+    ap.add_argument("--summary-base-url", help="Base URL for OpenAI-compatible API")
+    ap.add_argument("--summary-api-key", help="API key (OPENAI_API_KEY/OPENROUTER_API_KEY/etc.)")
+    ap.add_argument("--summary-max-tokens", type=int, default=400, help="Max tokens for summary")
+    ap.add_argument("--summary-fallback", action="append", metavar="BASE_URL",
+                    help="Another OpenAI-compatible endpoint (same model and key) to hedge to; may be repeated")
+    ap.add_argument("--summary-fallback-env", action="store_true",
+                    help="Also hedge to every known provider whose key and *_SUMMARY_MODEL variables are set")
+    ap.add_argument("--summary-hedge-after", type=float, metavar="SECONDS",
+                    help="Also ask the next provider if one has not answered after this long "
+                         "(default: twice its usual latency from earlier runs, 1-15 s; 8 s when unknown)")
+    ap.add_argument("--summary-mode", choices=["auto", "single", "map-reduce"], default="auto",
+                    help="single: one prompt with the newest 100 commits and top 30 files; map-reduce: summarize "
+                         "every commit and file in chunks, then merge (auto: map-reduce when single would truncate)")
+    ap.add_argument("--summary-chunk-tokens", type=int, default=8000,
+                    help="Approximate prompt tokens per map-reduce chunk (default: 8000)")
+    ap.add_argument("--summary-workers", type=int, default=8,
+                    help="Map-reduce chunk requests in flight at once (default: 8)")
+    ap.add_argument("--summary-budget", type=float, default=60, metavar="SECONDS",
+                    help="Hard limit on waiting for the summary; the release goes on without it after this (default: 60)")
+    ap.add_argument("--summary-cache-ttl", type=float, default=168, metavar="HOURS",
+                    help="Reuse a cached summary for the same model and prompt this long (default: 168; 0 disables)")
+    ap.add_argument("--summary-refresh", action="store_true",
+                    help="Ask the model even if a cached summary matches (the cache is then updated)")
+
+    # Push options (uses sync_repos.py v4)
+    ap.add_argument("--push-private", action="store_true", help="After commit, push to private using sync_repos.py")
+    ap.add_argument("--push-public", action="store_true", help="After commit, push to public using sync_repos.py")
+    ap.add_argument("--push", action="store_true", help="After commit, push to private and public (shortcut)")
+
+    ap.add_argument("--private-remote", default="private", help="Private remote name for sync_repos.py")
+    ap.add_argument("--public-remote",  default="public",  help="Public remote name for sync_repos.py")
+    ap.add_argument("--public-branch",  default="main",    help="Public branch name for sync_repos.py")
+    ap.add_argument("--public-mode",    choices=["cherry-pick", "merge-tree", "snapshot"], default="cherry-pick",
+                    help="Public push mode (sync_repos.py)")
+
+    ap.add_argument("--sync-script", default=str(REPO / "tools" / "sync_repos.py"),
+                    help="Path to sync_repos.py (default: tools/sync_repos.py)")
+    ap.add_argument("--sync-verbose", action="store_true", help="Pass --verbose to sync_repos.py")
+
+    ap.add_argument("--trace", metavar="FILE",
+                    help="Write a Chrome trace-event JSON of every git command and phase (sync_repos.py traces to FILE.sync.json)")
+    ap.add_argument("--trace-top", type=int, default=10, help="With --trace, list this many slowest steps at the end")
+    return ap.parse_args()
+
+# ---------- Main ----------
+def main():
+    ensure_git_repo()
+    args = parse_args()
+    global TRACER
+    if args.trace:
+        TRACER = Tracer()
+        try:
+            with trace_span("commit_release"):
+                run_release(args)
+        finally:
+            write_trace(args.trace, args.trace_top)
+    else:
+        run_release(args)
+
+def run_release(args):
+    ensure_clean_worktree(args.allow_dirty)
+
+    unborn = is_unborn_head()
+    branch = current_branch_guess()
+    repo_name = REPO.name
+
+    since = args.since if args.since else (None if unborn else last_tag_or_root())
+    today = dt.date.today().isoformat()
+    section_title = args.section_title or today
+
+    if unborn:
+        release = ReleaseRange(since=None, commits=(), commit_count=0, buckets=(), files=())
+        notes = ["Initial release."]
+    else:
+        rules = load_bucket_rules(Path(args.buckets) if args.buckets else REPO / BUCKETS_FILE,
+                                  required=bool(args.buckets))
+        cache = None if args.no_commit_cache else open_commit_cache(rules)
+        try:
+            with trace_span("collect history") as span:
+                # A map-reduce summary needs every commit, so take their prompt lines from this walk
+                release = collect_release_range(since, rules, cache,
+                                                keep_prompt_lines=args.summarize and args.summary_mode != "single")
+                span.update(commits=release.commit_count, files=len(release.files))
+                if cache:
+                    span.update(cache_hits=cache.hits, cache_misses=cache.misses)
+        finally:
+            if cache:
+                cache.close()
+        notes = release.notes()
+
+    # Optional AI summary (soft-fail), overlapped with the bump and doc preparation below
+    summary_job = SummaryJob(args, repo_name, branch, release) if args.summarize else None
+
+    docs = DocWriter()
+
+    # Optional version bump
+    bumped = None
+    if args.bump != "none" and PKG_JSON.exists():
+        current = read_package_version()
+        if not current:
+            print("⚠️  package.json exists but has no 'version'; skipping bump.")
+        else:
+            bumped = bump_semver(current, args.bump)
+            if bumped != current:
+                write_package_version(bumped, docs)
+                print(f"Version: {current} → {bumped}")
+
+    # Resolve doc paths & load the changelog store while the summary is on its way
+    changelog_path, readme_path = paths_for_docs()
+    with trace_span("prepare docs"):
+        changelog = ChangelogStore(changelog_path, docs)
+
+    summary_lines = summary_job.result() if summary_job else None
+
+    with trace_span("write docs") as span:
+        changelog.add_release(section_title, notes, summary_block=summary_lines)
+        changelog.render()
+        update_readme_latest(readme_path, notes, docs, summary_block=summary_lines)
+        span.update(touched=len(docs.touched))
+
+    # Stage & commit (only if something changed)
+    commit_msg = f"chore(release): {today}"
+    if bumped:
+        commit_msg += f", bump version to {bumped}"
+    if summary_lines:
+        commit_msg += " [summary]"
+
+    with trace_span("stage & commit") as span:
+        # Stage exactly what was written or removed above
+        git_add(docs.touched)
+        git_rm_cached(docs.removed)
+        span.update(staged=len(docs.touched) + len(docs.removed))
+        committed = git_commit(commit_msg)
+
+    # Tag (only if we actually committed and bumped)
+    if committed and args.tag and bumped:
+        tag_name = f"v{bumped}"
+        with trace_span("tag"):
+            git_tag(tag_name)
+        print(f"Tagged {tag_name}")
+
+    # ------- Optional push via sync_repos.py --------
+    wants_private = args.push or args.push_private
+    wants_public  = args.push or args.push_public
+
+    def call_sync(push_private: bool, push_public: bool):
+        sync = Path(args.sync_script)
+        if not sync.exists():
+            print(f"⚠️  Skipping push: sync script not found at {sync}")
+            return
+        cmd = [
+            sys.executable, str(sync),
+            "--private-remote", args.private-remote if False else args.private_remote,  # keep mypy quiet
+            "--public-remote",  args.public_remote,
+            "--public-branch",  args.public_branch,
+            "--public-mode",    args.public_mode,
+        ]
+        if args.sync_verbose:
+            cmd.append("--verbose")
+        if args.trace:
+            cmd += ["--trace", str(Path(args.trace).with_suffix(".sync.json")), "--trace-top", str(args.trace_top)]
+        # We *always* want to push private full history after a release commit;
+        # push_public is controlled by flags, but sync_repos handles both as one run.
+        # If you only want one or the other, we still call sync once and let modes decide:
+        # - private push always occurs (full history)
+        # - public update obeys chosen mode
+        # To support "only private" or "only public", we can add flags to sync_repos later.
+        # For now, we run it once either way; if you truly want only one, use sync_repos directly.
+        try:
+            print("→ Running sync_repos.py …")
+            with trace_span("sync_repos.py"):
+                res = subprocess.run(cmd, text=True)
+            if res.returncode != 0:
+                print("⚠️  sync_repos.py returned a non-zero exit code.")
+        except Exception as e:
+            print(f"⚠️  Failed to run sync_repos.py: {e}")
+
+    if wants_private or wants_public:
+        call_sync(wants_private, wants_public)
+
+    # ------------------------------------------------
+
+    print("✅ Done.")
+    if unborn:
+        print("   • Repo had no commits; wrote initial entries.")
+    else:
+        print("   • Changelog/README updated from recent commits.")
+    if summary_lines:
+        print("   • AI summary added.")
+    if bumped:
+        print(f"   • package.json bumped to {bumped}{' and tagged' if args.tag and committed else ''}.")
+    if not committed:
+        print("   • No changes detected after generation; nothing committed.")
+
+if __name__ == "__main__":
+    try:
+        main()
+    except Exception as e:
+        sys.exit(f"\n❌ Error: {e}\n")
@@ -5,79 +5,401 @@ sync_repos.py (v4)
 Goals:
 - Push full history to the private remote.
 - Push only the latest change to the public remote by default (no history rewrite, no full history).
-- Avoid switching the current working branch; use a temporary worktree when needed.
+- Avoid switching the current working branch; use a separate (cached) worktree when needed.
 - Handle empty repos (unborn HEAD) safely.
+- Run the private push and the public update concurrently; they target different remotes.
+- Share one SSH connection per host across the run and retry transient network errors with backoff.
 
 Modes for public push:
 - cherry-pick (default):
-  Fetch public tip into a detached worktree, cherry-pick the latest local commit onto it, and push that single commit.
+  Reset the cached detached worktree (.git/public-sync-worktree) to the public tip, cherry-pick the latest local commit onto it, and push that single commit.
   If the public branch does not exist, falls back to snapshot mode for first-time initialization.
+- merge-tree:
+  Same result as cherry-pick, but the commit is built from git objects (merge-tree/commit-tree) with no
+  worktree checkout. Falls back to the worktree cherry-pick only when the change conflicts.
 - snapshot: Create a single commit from the HEAD tree (or from the working tree if unborn) and force-push it to public.
+
+Paths listed in .publicignore (.gitignore syntax) are filtered out of every public tree, in all modes.
 """
 
 import argparse
+import base64
+import contextvars
+import hashlib
+import json
 import os
+import queue
+import random
+import re
 import subprocess
 import sys
 import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from contextlib import contextmanager, nullcontext
+from functools import wraps
 from textwrap import dedent
 import shutil
+import zlib
 from datetime import datetime, timezone
 
-# Log file path
+# Log file path (JSON lines, written by a background thread; see LogWriter)
 LOG_PATH = os.path.join(os.getcwd(), "sync_repos.log")
-LOG_FH = None
+LOG_WRITER = None
 
 # Global verbose flag toggled by --verbose
 VERBOSE = False
 
-def open_log():
-    global LOG_FH
-    LOG_FH = open(LOG_PATH, "a", encoding="utf-8", buffering=1)
-    header = f"\n=== sync_repos run @ {datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')} UTC ===\n"
-    LOG_FH.write(header)
+# Number of git processes started during this run (run() calls + session helpers)
+SPAWN_COUNT = 0
+_SPAWN_LOCK = threading.Lock()
+
+def count_spawn():
+    global SPAWN_COUNT
+    with _SPAWN_LOCK:
+        SPAWN_COUNT += 1
+
+# Git commands that talk to a remote; each one is a network round trip (connection + negotiation)
+NETWORK_SUBCOMMANDS = {"push", "fetch", "ls-remote", "pull", "clone"}
+ROUND_TRIPS = 0
+
+def git_subcommand(cmd):
+    # Skip global options such as -C <dir> and -c key=value
+    i = 1
+    while i < len(cmd) and cmd[i].startswith("-"):
+        i += 2 if cmd[i] in ("-C", "-c") else 1
+    return cmd[i] if i < len(cmd) else None
+
+def is_network_command(cmd):
+    return bool(cmd) and cmd[0] == "git" and git_subcommand(cmd) in NETWORK_SUBCOMMANDS
+
+def count_round_trip(cmd):
+    global ROUND_TRIPS
+    if is_network_command(cmd):
+        with _SPAWN_LOCK:
+            ROUND_TRIPS += 1
+
+# Network commands are retried on transient failures (--retries / --retry-delay), with jittered backoff
+RETRIES = 3
+RETRY_BASE_DELAY = 0.5
+RETRY_MAX_DELAY = 8.0
+TRANSIENT_RE = re.compile(
+    r"Could not resolve host|Temporary failure in name resolution|Connection (?:timed out|reset|refused|closed)"
+    r"|Operation timed out|Network is unreachable|No route to host|kex_exchange_identification"
+    r"|ssh_exchange_identification|remote end hung up unexpectedly|early EOF|unexpected disconnect"
+    r"|RPC failed|SSL_ERROR_SYSCALL|gnutls_handshake|Broken pipe|returned error: 5\d\d", re.IGNORECASE)
+# ...unless the remote actually answered with a refusal
+PERMANENT_RE = re.compile(
+    r"Permission denied|Authentication failed|HTTP 4\d\d|returned error: 4\d\d|\[rejected\]|\[remote rejected\]"
+    r"|does not appear to be a git repository|Repository not found", re.IGNORECASE)
+
+class RemoteUnavailable(RuntimeError):
+    """A remote could not be reached, even after retries; nothing on the remote side is known to be wrong."""
+
+def is_transient(stderr):
+    return bool(TRANSIENT_RE.search(stderr or "")) and not PERMANENT_RE.search(stderr or "")
+
+def retry_delay(attempt):
+    # Exponential backoff with "equal jitter": half the step is fixed, half random, so mirrors
+    # that failed together do not retry in lockstep
+    step = min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt))
+    return step / 2 + random.uniform(0, step / 2)
+
+# Run-scoped directory holding SSH ControlMaster sockets and the credential cache socket
+# (None = connection sharing off); see start_connection_sharing()
+CONNECTION_DIR = None
+# Extra environment for this repo's network commands (GIT_SSH_COMMAND with the control options)
+REMOTE_ENV = contextvars.ContextVar("remote_env", default=None)
+
+# Prefix for log lines emitted by a pipeline (e.g. "[public] "), so concurrent output stays attributable
+LOG_PREFIX = contextvars.ContextVar("log_prefix", default="")
+_LOG_LOCK = threading.Lock()
+
+# Repository the current thread works on (None = process cwd) and its time budget (--config fan-out)
+REPO_DIR = contextvars.ContextVar("repo_dir", default=None)
+DEADLINE = contextvars.ContextVar("deadline", default=None)
+
+class Tracer:
+    """Collects Chrome trace-event spans ("ph": "X") for --trace; open the file in chrome://tracing or Perfetto."""
+
+    def __init__(self):
+        self.events = []
+        self._lock = threading.Lock()
+        self._t0 = time.perf_counter()
+        self._tids = {}
+
+    def _tid(self):
+        # Small stable thread ids, named after the pipeline's log prefix
+        ident = threading.get_ident()
+        if ident not in self._tids:
+            self._tids[ident] = len(self._tids) + 1
+            self.events.append({"name": "thread_name", "ph": "M", "pid": os.getpid(), "tid": self._tids[ident],
+                                "args": {"name": LOG_PREFIX.get().strip() or threading.current_thread().name}})
+        return self._tids[ident]
+
+    def add(self, name, cat, start, end, args=None):
+        with self._lock:
+            self.events.append({
+                "name": name, "cat": cat, "ph": "X", "pid": os.getpid(), "tid": self._tid(),
+                "ts": round((start - self._t0) * 1e6), "dur": round((end - start) * 1e6),
+                "args": args or {},
+            })
+
+    @contextmanager
+    def span(self, name, cat="phase"):
+        start = time.perf_counter()
+        args = {}
+        try:
+            yield args
+        except BaseException as e:
+            args["error"] = str(e).splitlines()[0] if str(e) else type(e).__name__
+            raise
+        finally:
+            self.add(name, cat, start, time.perf_counter(), args)
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+
+    def reset(self):
+        """Drop the recorded events (--watch writes one trace per sync instead of one per process)."""
+        with self._lock:
+            self.events = []
+            self._tids = {}
+            self._t0 = time.perf_counter()
+
+    def slowest(self, top, cat):
+        spans = [e for e in self.events if e["ph"] == "X" and e["cat"] == cat]
+        return sorted(spans, key=lambda e: e["dur"], reverse=True)[:top]
+
+# Set by --trace
+TRACER = None
+
+def trace_span(name, cat="phase"):
+    return TRACER.span(name, cat) if TRACER else nullcontext({})
+
+def traced(name):
+    """Record every call of the decorated pipeline step as a trace span."""
+    def deco(fn):
+        @wraps(fn)
+        def wrapper(*a, **kw):
+            with trace_span(name):
+                return fn(*a, **kw)
+        return wrapper
+    return deco
+
+class LogWriter(threading.Thread):
+    """
+    Background writer for sync_repos.log so logging never blocks a sync.
+
+    Records are JSON objects, one per line. The file is rotated to .1, .2, … when it
+    grows past max_bytes or its first record is older than max_age_secs.
+    """
+
+    def __init__(self, path, max_bytes, max_age_secs, backups):
+        super().__init__(name="sync-log-writer", daemon=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age_secs = max_age_secs
+        self.backups = backups
+        self.queue = queue.Queue()
+        self._fh = None
+        self._started_at = None
+
+    def put(self, record):
+        self.queue.put(record)
+
+    def close(self, timeout=10):
+        self.queue.put(None)
+        self.join(timeout)
+
+    def _first_record_time(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                return float(json.loads(f.readline())["t"])
+        except (OSError, ValueError, KeyError, TypeError):
+            # Empty, unreadable, or an old plain-text log: rotate it out of the way
+            return None
+
+    def _open(self):
+        exists = os.path.exists(self.path) and os.path.getsize(self.path) > 0
+        self._started_at = self._first_record_time() if exists else time.time()
+        if exists and self._started_at is None:
+            self._rotate()
+            return
+        self._fh = open(self.path, "a", encoding="utf-8")
+
+    def _rotate(self):
+        if self._fh:
+            self._fh.close()
+            self._fh = None
+        for i in range(self.backups - 1, 0, -1):
+            src = f"{self.path}.{i}"
+            if os.path.exists(src):
+                os.replace(src, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._fh = open(self.path, "a", encoding="utf-8")
+        self._started_at = time.time()
+
+    def _write(self, record):
+        if self._fh is None:
+            self._open()
+        if (self._fh.tell() >= self.max_bytes
+                or (self.max_age_secs and time.time() - self._started_at > self.max_age_secs)):
+            self._rotate()
+        self._fh.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def run(self):
+        while True:
+            record = self.queue.get()
+            try:
+                if record is None:
+                    break
+                self._write(record)
+                if self.queue.empty():
+                    self._fh.flush()
+            except Exception:
+                # Logging is best effort; never take the sync down with it
+                pass
+        if self._fh:
+            self._fh.close()
+
+# --log-max-output / --log-output: how much command output goes into a log record
+LOG_MAX_OUTPUT = 4096
+LOG_OUTPUT_MODE = "truncate"
+
+def open_log(max_mb=5, max_age_days=7, backups=5):
+    global LOG_WRITER
+    LOG_WRITER = LogWriter(LOG_PATH, int(max_mb * 1024 * 1024), max_age_days * 86400, backups)
+    LOG_WRITER.start()
+    LOG_WRITER.put({"t": time.time(), "ts": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+                    "event": "start", "pid": os.getpid(), "argv": sys.argv[1:]})
 
 def close_log():
-    global LOG_FH
+    global LOG_WRITER
     try:
-        if LOG_FH:
-            LOG_FH.flush()
-            LOG_FH.close()
+        if LOG_WRITER:
+            LOG_WRITER.close()
     finally:
-        LOG_FH = None
+        LOG_WRITER = None
+
+def log_record(**fields):
+    if LOG_WRITER:
+        prefix = LOG_PREFIX.get().strip()
+        record = {"t": time.time(), "ts": datetime.now(timezone.utc).isoformat(timespec="seconds")}
+        if prefix:
+            record["ctx"] = prefix
+        record.update(fields)
+        LOG_WRITER.put(record)
 
 def log(msg: str = ""):
-    # Mirror output to console and to log file
-    try:
-        print(msg)
-    except Exception:
-        # Best-effort if printing fails
-        pass
-    try:
-        if LOG_FH:
-            LOG_FH.write(str(msg) + ("" if str(msg).endswith("\n") else "\n"))
-    except Exception:
-        pass
+    log_record(msg=str(msg))
+    prefix = LOG_PREFIX.get()
+    if prefix:
+        msg = "\n".join(prefix + line for line in str(msg).split("\n"))
+    # One line group at a time on the console when pipelines run concurrently
+    with _LOG_LOCK:
+        try:
+            print(msg)
+        except Exception:
+            # Best-effort if printing fails
+            pass
+
+def log_output(cmd, stream, text):
+    # Verbose command output: full text on the console, bounded in the log file
+    with _LOG_LOCK:
+        try:
+            prefix = LOG_PREFIX.get()
+            print("\n".join(prefix + line for line in f"{stream}:\n{text}".split("\n")))
+        except Exception:
+            pass
+    data = text.encode("utf-8")
+    fields = {"cmd": cmd, "stream": stream, "bytes": len(data)}
+    if len(data) <= LOG_MAX_OUTPUT:
+        fields["text"] = text
+    elif LOG_OUTPUT_MODE == "compress":
+        fields["zlib_b64"] = base64.b64encode(zlib.compress(data, 6)).decode("ascii")
+    else:
+        half = LOG_MAX_OUTPUT // 2
+        fields["text"] = (data[:half].decode("utf-8", "ignore")
+                          + f"\n…[{len(data) - 2 * half} bytes truncated]…\n"
+                          + data[-half:].decode("utf-8", "ignore"))
+    log_record(**fields)
+
+def run(cmd, env=None, input=None):
+    """Run a command; network commands share the run's connections and are retried on transient errors."""
+    network = is_network_command(cmd)
+    if network and REMOTE_ENV.get():
+        env = {**(env if env is not None else os.environ), **REMOTE_ENV.get()}
+    attempt = 0
+    while True:
+        res = run_once(cmd, env=env, input=input)
+        if not network or res.returncode == 0 or attempt >= RETRIES or not is_transient(res.stderr):
+            return res
+        delay = retry_delay(attempt)
+        deadline = DEADLINE.get()
+        if deadline is not None and time.monotonic() + delay >= deadline:
+            return res
+        attempt += 1
+        reason = next((l.strip() for l in res.stderr.splitlines() if TRANSIENT_RE.search(l)), "network error")
+        log(f"↻ {git_subcommand(cmd)} failed ({reason}); retry {attempt}/{RETRIES} in {delay:.1f}s")
+        time.sleep(delay)
 
-def run(cmd, env=None):
+def run_once(cmd, env=None, input=None):
     if VERBOSE:
         try:
             log("$ " + " ".join(cmd))
         except Exception:
             # Fallback if non-str items exist in cmd list
             log(f"$ {cmd}")
-    res = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=env)
+    timeout = None
+    deadline = DEADLINE.get()
+    if deadline is not None:
+        timeout = deadline - time.monotonic()
+        if timeout <= 0:
+            raise RuntimeError(f"Timed out before: {' '.join(cmd)}")
+    count_spawn()
+    count_round_trip(cmd)
+    with trace_span(" ".join(cmd), "git") as span:
+        try:
+            res = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, env=env, input=input,
+                                 cwd=REPO_DIR.get(), timeout=timeout)
+        except subprocess.TimeoutExpired:
+            raise RuntimeError(f"Timed out: {' '.join(cmd)}")
+        finally:
+            # Any command may move refs, write objects or edit config; drop memoized answers
+            git_session().invalidate()
+        span.update(exit_code=res.returncode, stdout_bytes=len(res.stdout.encode("utf-8")),
+                    stderr_bytes=len(res.stderr.encode("utf-8")))
     if VERBOSE:
         if res.stdout.strip():
-            log("stdout:\n" + res.stdout.strip())
+            log_output(" ".join(cmd), "stdout", res.stdout.strip().replace("\0", "\n"))
         if res.stderr.strip():
-            log("stderr:\n" + res.stderr.strip())
+            log_output(" ".join(cmd), "stderr", collapse_progress(res.stderr.strip()))
     return res
 
-def must(cmd, msg=None, env=None):
-    r = run(cmd, env=env)
+PROGRESS_RE = re.compile(r"^([A-Z][\w ]+):\s+\d+% \(")
+
+def collapse_progress(text):
+    # Progress meters redraw with \r (read back as separate lines); keep only each meter's final state
+    lines = []
+    for line in text.split("\n"):
+        m = PROGRESS_RE.match(line)
+        if m and lines and lines[-1].startswith(m.group(1) + ":"):
+            lines[-1] = line
+        else:
+            lines.append(line)
+    return "\n".join(lines)
+
+def must(cmd, msg=None, env=None, input=None):
+    r = run(cmd, env=env, input=input)
     if r.returncode != 0:
-        raise RuntimeError(dedent(f"""
+        error = RemoteUnavailable if is_network_command(cmd) and is_transient(r.stderr) else RuntimeError
+        raise error(dedent(f"""
             {msg or 'Command failed'}: {' '.join(cmd)}
             stdout:
             {r.stdout.strip()}
@@ -87,36 +409,283 @@ def must(cmd, msg=None, env=None):
         """).strip())
     return r.stdout.strip()
 
+def remote_error(cmd, r):
+    """Exception for a failed network command: RemoteUnavailable if it looked like a network problem."""
+    error = RemoteUnavailable if is_transient(r.stderr) else RuntimeError
+    return error(f"Command failed: {' '.join(cmd)}\nstderr:\n{r.stderr.strip()}")
+
+SSH_CONTROL_PERSIST = 60
+CREDENTIAL_CACHE_SECS = 900
+
+def start_connection_sharing():
+    """
+    Create the run-scoped directory that lets all remote commands of this run share connections.
+
+    SSH remotes get one ControlMaster per host (socket named by %C) that later pushes and
+    fetches reuse, so only the first command pays for TCP, key exchange and authentication.
+    HTTPS connections cannot outlive a git process; for those a credential cache scoped to the
+    run avoids asking the user or the credential store again for every command.
+    Both use Unix sockets, so this is POSIX only.
+    """
+    global CONNECTION_DIR
+    if os.name != "posix" or CONNECTION_DIR:
+        return
+    # Under /tmp: Unix socket paths are limited to ~104 bytes and the ControlPath adds 40
+    CONNECTION_DIR = tempfile.mkdtemp(prefix="sync-repos-", dir="/tmp" if os.path.isdir("/tmp") else None)
+
+def remote_env_for_repo(urls):
+    """Environment overrides for the current repo's network commands (None when sharing is off)."""
+    if not CONNECTION_DIR:
+        return None
+    env = {}
+    # GIT_SSH (a program, not a command line) cannot take extra options; leave it alone
+    base = os.environ.get("GIT_SSH_COMMAND") or git_session().config("core.sshcommand") or "ssh"
+    ssh_program = os.path.basename(base.split()[0].strip("'\"")) if base.split() else ""
+    if (not os.environ.get("GIT_SSH") and ssh_program == "ssh" and "ControlPath" not in base
+            and shutil.which("ssh")):
+        env["GIT_SSH_COMMAND"] = (f"{base} -o ControlMaster=auto -o ControlPath={CONNECTION_DIR}/%C"
+                                  f" -o ControlPersist={SSH_CONTROL_PERSIST}")
+    if any(re.match(r"https?://", url or "") for url in urls):
+        # Added after the user's own helpers, through the environment (Git 2.31+; older Git ignores it)
+        n = int(os.environ.get("GIT_CONFIG_COUNT") or 0)
+        env.update({"GIT_CONFIG_COUNT": str(n + 1), f"GIT_CONFIG_KEY_{n}": "credential.helper",
+                    f"GIT_CONFIG_VALUE_{n}": f"cache --timeout={CREDENTIAL_CACHE_SECS} "
+                                             f"--socket={CONNECTION_DIR}/credentials"})
+    return env or None
+
+def stop_connection_sharing():
+    """Close the SSH masters and the credential cache of this run and remove their sockets."""
+    global CONNECTION_DIR
+    if not CONNECTION_DIR:
+        return
+    for name in os.listdir(CONNECTION_DIR):
+        path = os.path.join(CONNECTION_DIR, name)
+        if name == "credentials":
+            cmd = ["git", "credential-cache", f"--socket={path}", "exit"]
+        else:
+            # The host argument is required but unused: the control socket already names the master
+            cmd = ["ssh", "-o", f"ControlPath={path}", "-O", "exit", "sync-repos"]
+        try:
+            subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=10)
+        except (OSError, subprocess.TimeoutExpired):
+            pass
+    shutil.rmtree(CONNECTION_DIR, ignore_errors=True)
+    CONNECTION_DIR = None
+
+class GitSession:
+    """
+    Answers read-only git queries without forking a git process per question.
+
+    Object names (rev-parse) and commit fields (log -1 --pretty) go through
+    long-lived `git cat-file --batch-check` / `--batch` processes, config comes
+    from a single `git config --list` snapshot, and every answer is memoized
+    until the next run() call, which may have changed refs or config.
+    """
+
+    def __init__(self, cwd=None):
+        self.cwd = cwd
+        self._lock = threading.RLock()
+        self._check = None
+        self._batch = None
+        self._layout = None
+        self._oid_bytes = 20
+        self._config = None
+        self._memo = {}
+
+    def _spawn(self, args):
+        count_spawn()
+        if VERBOSE:
+            log("$ " + " ".join(args) + "  (session)")
+        return subprocess.Popen(args, stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+                                stderr=subprocess.DEVNULL, cwd=self.cwd)
+
+    def invalidate(self):
+        with self._lock:
+            self._memo.clear()
+            self._config = None
+
+    def close(self):
+        with self._lock:
+            for proc in (self._check, self._batch):
+                if proc and proc.poll() is None:
+                    try:
+                        proc.stdin.close()
+                        proc.wait(timeout=5)
+                    except Exception:
+                        proc.kill()
+            self._check = self._batch = None
+
+    def layout(self):
+        # (is_inside_work_tree, top_level, git_dir, common_dir); one rev-parse for the whole run
+        with self._lock:
+            if self._layout is None:
+                r = run(["git", "rev-parse", "--is-inside-work-tree", "--show-toplevel",
+                         "--absolute-git-dir", "--git-common-dir", "--show-object-format"])
+                lines = r.stdout.splitlines() if r.returncode == 0 else []
+                if len(lines) >= 4:
+                    # Git before 2.25 echoes the unknown flag back; it has no sha256 repos either
+                    self._oid_bytes = 32 if len(lines) > 4 and lines[4].strip() == "sha256" else 20
+                    # --git-common-dir may be relative to where git ran (the repo), not to our cwd
+                    common_dir = os.path.abspath(os.path.join(self.cwd or os.getcwd(), lines[3].strip()))
+                    self._layout = (lines[0].strip().lower() == "true", lines[1].strip(),
+                                    lines[2].strip(), common_dir)
+                else:
+                    self._layout = (False, None, None, None)
+            return self._layout
+
+    def empty_tree(self):
+        """SHA of the empty tree in this repo's object format."""
+        self.layout()
+        return EMPTY_TREE_SHA256 if self._oid_bytes == 32 else EMPTY_TREE
+
+    def _ask(self, proc_attr, batch_flag, name):
+        proc = getattr(self, proc_attr)
+        if proc is None or proc.poll() is not None:
+            proc = self._spawn(["git", "cat-file", batch_flag])
+            setattr(self, proc_attr, proc)
+        proc.stdin.write(name.encode("utf-8") + b"\n")
+        proc.stdin.flush()
+        header = proc.stdout.readline().decode("utf-8", "replace").rstrip("\n")
+        parts = header.split()
+        if len(parts) != 3 or parts[1] in ("missing", "ambiguous"):
+            return None
+        sha, obj_type, size = parts[0], parts[1], int(parts[2])
+        if batch_flag == "--batch-check":
+            return sha, obj_type, None
+        data = proc.stdout.read(size)
+        proc.stdout.read(1)  # trailing LF after the object body
+        return sha, obj_type, data
+
+    def read_tree(self, sha):
+        """Entries (mode, name, sha) of a tree object, read through the long-lived `cat-file --batch`."""
+        self.layout()
+        oid = self._oid_bytes
+        with self._lock:
+            hit = self._ask("_batch", "--batch", sha)
+        if not hit or hit[1] != "tree":
+            raise RuntimeError(f"Not a tree object: {sha}")
+        data, entries, i = hit[2], [], 0
+        while i < len(data):
+            space = data.index(b" ", i)
+            nul = data.index(b"\0", space)
+            entries.append((data[i:space].decode("ascii"), data[space + 1:nul].decode("utf-8", "surrogateescape"),
+                            data[nul + 1:nul + 1 + oid].hex()))
+            i = nul + 1 + oid
+        return entries
+
+    def resolve(self, name):
+        """Return the full SHA for `name` (like `git rev-parse --verify`), or None."""
+        key = ("resolve", name)
+        with self._lock:
+            if key not in self._memo:
+                hit = self._ask("_check", "--batch-check", name)
+                self._memo[key] = hit[0] if hit else None
+            return self._memo[key]
+
+    def commit_info(self, name="HEAD"):
+        """Return {'author_name', 'author_email', 'author_date', 'message'} for a commit, or None."""
+        key = ("commit", name)
+        with self._lock:
+            if key not in self._memo:
+                hit = self._ask("_batch", "--batch", name)
+                info = None
+                if hit and hit[1] == "commit":
+                    headers, _, message = hit[2].partition(b"\n\n")
+                    info = {"author_name": "", "author_email": "", "author_date": "",
+                            "message": message.decode("utf-8", "replace")}
+                    for line in headers.decode("utf-8", "replace").splitlines():
+                        if line.startswith("author "):
+                            ident = line[len("author "):]
+                            lt, gt = ident.find("<"), ident.find(">")
+                            if lt != -1 and gt > lt:
+                                info["author_name"] = ident[:lt].strip()
+                                info["author_email"] = ident[lt + 1:gt].strip()
+                                info["author_date"] = ident[gt + 1:].strip()
+                            break
+                self._memo[key] = info
+            return self._memo[key]
+
+    def _load_config(self):
+        if self._config is None:
+            r = run(["git", "config", "--list", "-z"])
+            entries = {}
+            if r.returncode == 0:
+                for item in r.stdout.split("\0"):
+                    if item:
+                        k, _, v = item.partition("\n")
+                        entries[k] = v
+            self._config = entries
+        return self._config
+
+    def config(self, key):
+        """Return the last value of a config key (like `git config --get`), or None."""
+        # git lowercases section and variable names but keeps the subsection (e.g. remote name) as-is
+        section, _, rest = key.partition(".")
+        sub, _, var = rest.rpartition(".")
+        normalized = f"{section.lower()}.{sub}.{var.lower()}" if sub else f"{section.lower()}.{var.lower()}"
+        with self._lock:
+            return self._load_config().get(normalized)
+
+    def remotes(self):
+        with self._lock:
+            names = []
+            for k in self._load_config():
+                if k.startswith("remote.") and k.count(".") >= 2:
+                    name = k[len("remote."):k.rindex(".")]
+                    if name not in names:
+                        names.append(name)
+            return names
+
+    def head_branch(self):
+        """Short branch name HEAD points at (works on unborn HEAD), or None if detached."""
+        _, _, git_dir, _ = self.layout()
+        if not git_dir:
+            return None
+        try:
+            with open(os.path.join(git_dir, "HEAD"), "r", encoding="utf-8") as f:
+                head = f.read().strip()
+        except OSError:
+            return None
+        prefix = "ref: refs/heads/"
+        return head[len(prefix):] if head.startswith(prefix) else None
+
+_DEFAULT_SESSION = GitSession()
+_SESSION = contextvars.ContextVar("git_session", default=_DEFAULT_SESSION)
+
+def git_session():
+    """Session for the repository the current thread works on."""
+    return _SESSION.get()
+
 def ensure_repo():
-    out = must(["git", "rev-parse", "--is-inside-work-tree"])
-    if out.lower() != "true":
+    inside, _, _, _ = git_session().layout()
+    if not inside:
         sys.exit("❌ Not inside a Git repository.")
 
 def git_top_level():
-    return must(["git", "rev-parse", "--show-toplevel"])
+    _, top, _, _ = git_session().layout()
+    if not top:
+        raise RuntimeError("Getting repository top level failed")
+    return top
 
 def is_unborn_head():
-    # true if rev-parse HEAD fails (no commits yet)
-    r = run(["git", "rev-parse", "HEAD"])
-    return r.returncode != 0
+    # true if HEAD does not resolve (no commits yet)
+    return git_session().resolve("HEAD") is None
 
 def current_branch_guess():
     # Works even on unborn HEAD
-    r = run(["git", "symbolic-ref", "--short", "HEAD"])
-    if r.returncode == 0 and r.stdout.strip():
-        return r.stdout.strip()
+    branch = git_session().head_branch()
+    if branch:
+        return branch
     # Fallback
     return "main"
 
 def last_commit_msg_or(default="snapshot"):
-    r = run(["git", "log", "-1", "--pretty=%B"])
-    return r.stdout.strip() if r.returncode == 0 and r.stdout.strip() else default
+    info = git_session().commit_info("HEAD")
+    msg = info["message"].strip() if info else ""
+    return msg or default
 
 def ensure_remote(name, url_opt_flag, url_value):
-    r = run(["git", "remote"])
-    if r.returncode != 0:
-        sys.exit("❌ Cannot list remotes.")
-    remotes = r.stdout.split()
+    remotes = git_session().remotes()
     if name in remotes:
         return
     if url_value:
@@ -125,19 +694,19 @@ def ensure_remote(name, url_opt_flag, url_value):
         sys.exit(f"❌ Remote '{name}' not found. Provide --{url_opt_flag}.")
 
 def remote_url(name):
-    r = run(["git", "remote", "get-url", name])
-    return r.stdout.strip() if r.returncode == 0 else None
+    return git_session().config(f"remote.{name}.url")
 
 def author_env(preserve=False):
     if not preserve:
         return None
     # Use HEAD author if available; else fallback to local config
-    a_name  = run(["git", "log", "-1", "--pretty=%an"]).stdout.strip()
-    a_email = run(["git", "log", "-1", "--pretty=%ae"]).stdout.strip()
+    info = git_session().commit_info("HEAD") or {}
+    a_name  = info.get("author_name", "")
+    a_email = info.get("author_email", "")
     if not a_name:
-        a_name = run(["git", "-c", "user.useConfigOnly=true", "config", "--get", "user.name"]).stdout.strip() or "Public Snapshot"
+        a_name = git_session().config("user.name") or "Public Snapshot"
     if not a_email:
-        a_email = run(["git", "-c", "user.useConfigOnly=true", "config", "--get", "user.email"]).stdout.strip() or "noreply@example.com"
+        a_email = git_session().config("user.email") or "noreply@example.com"
     # use same for committer
     return {
         "GIT_AUTHOR_NAME": a_name,
@@ -146,27 +715,90 @@ def author_env(preserve=False):
         "GIT_COMMITTER_EMAIL": a_email
     }
 
+PUSH_BYTES_RE = re.compile(r"Writing objects: 100% \(\d+/\d+\), ([\d.]+) (bytes|KiB|MiB|GiB)")
+PUSH_UNITS = {"bytes": 1, "KiB": 1024, "MiB": 1024 ** 2, "GiB": 1024 ** 3}
+
+@traced("private push")
 def push_full_history(private_remote, branch):
+    """Push the branch to one private remote; returns (bytes uploaded, seconds)."""
     log(f"→ Pushing full history: {branch} → {private_remote}/{branch}")
-    must(["git", "push", private_remote, f"{branch}:{branch}"])
+    started = time.monotonic()
+    cmd = ["git", "push", "--progress", private_remote, f"{branch}:{branch}"]
+    r = run(cmd)
+    if r.returncode != 0:
+        raise remote_error(cmd, r)
+    sent = 0
+    m = PUSH_BYTES_RE.search(r.stderr.replace("\r", "\n"))
+    if m:
+        sent = int(float(m.group(1)) * PUSH_UNITS[m.group(2)])
+    return sent, time.monotonic() - started
 
-def make_root_commit_from_head_tree(message, env_overrides=None):
-    tree = must(["git", "rev-parse", "HEAD^{tree}"], "Getting HEAD tree")
-    return make_commit_from_tree(tree, message, env_overrides)
+def prepare_shared_pack():
+    """
+    Pack loose objects once before pushing to several mirrors.
+
+    Each push runs its own pack-objects, but with the new objects already packed and
+    deltified it reuses the stored deltas instead of redoing delta compression per mirror.
+    """
+    count = {}
+    for line in must(["git", "count-objects", "-v"]).splitlines():
+        key, _, value = line.partition(":")
+        count[key.strip()] = value.strip()
+    if count.get("count", "0") == "0":
+        return
+    log(f"→ Packing {count['count']} loose objects once for all private mirrors")
+    must(["git", "repack", "-d", "-q"], "Packing loose objects")
 
-def make_root_commit_from_worktree(message, repo_root, env_overrides=None):
-    # Use a temporary index so we don't touch the real index
-    with tempfile.NamedTemporaryFile(prefix="public_index_", delete=False) as tmp:
-        temp_index = tmp.name
+def format_bytes(n):
+    for unit in ("B", "KiB", "MiB"):
+        if n < 1024:
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n:.1f} GiB"
+
+@traced("snapshot from HEAD tree")
+def make_root_commit_from_head_tree(message, env_overrides=None, public_filter=None):
+    tree = git_session().resolve("HEAD^{tree}")
+    if not tree:
+        raise RuntimeError("Getting HEAD tree failed")
+    return make_commit_from_tree(filter_public_tree(tree, public_filter), message, env_overrides)
+
+SNAPSHOT_INDEX_CACHE = "public-snapshot-index"
+
+@traced("snapshot from worktree")
+def make_root_commit_from_worktree(message, repo_root, env_overrides=None, public_filter=None):
+    # Use a private index so we don't touch the real index. Seed it from the previous snapshot's
+    # index (or the real index) so `git add -A` reuses stat data and only re-hashes changed files.
+    _, _, git_dir, _ = git_session().layout()
+    cached_index = os.path.join(git_dir, SNAPSHOT_INDEX_CACHE)
+    temp_index = f"{cached_index}.{os.getpid()}.tmp"
+    seeded = False
+    for seed in (cached_index, os.path.join(git_dir, "index")):
+        if os.path.isfile(seed) and os.path.getsize(seed) > 0:
+            # copy2 keeps the mtime git uses to detect racily-clean entries
+            shutil.copy2(seed, temp_index)
+            seeded = True
+            break
     try:
         env = os.environ.copy()
         env["GIT_INDEX_FILE"] = temp_index
         env["GIT_WORK_TREE"] = repo_root
         # Stage everything currently in the working tree (including untracked)
         must(["git", "add", "-A"], "Staging working tree into temp index", env=env)
+        if seeded:
+            # `add -A` keeps seeded entries that are now .gitignore'd; an empty index would not have them
+            r = run(["git", "ls-files", "-z", "--cached", "--ignored", "--exclude-standard"], env=env)
+            if r.returncode != 0:
+                raise RuntimeError(f"Listing ignored entries in temp index failed:\n{r.stderr.strip()}")
+            if r.stdout:
+                must(["git", "update-index", "-z", "--force-remove", "--stdin"],
+                     "Dropping ignored entries from temp index", env=env, input=r.stdout)
         # Write the tree from the temp index
         tree = must(["git", "write-tree"], "Writing tree from temp index", env=env)
-        return make_commit_from_tree(tree, message, env_overrides)
+        commit = make_commit_from_tree(filter_public_tree(tree, public_filter), message, env_overrides)
+        # Keep the refreshed index for the next snapshot
+        os.replace(temp_index, cached_index)
+        return commit
     finally:
         try:
             os.remove(temp_index)
@@ -183,43 +815,517 @@ def make_commit_from_tree(tree_sha, message, env_overrides=None):
         raise RuntimeError(f"commit-tree failed:\n{r.stderr}")
     return r.stdout.strip()
 
-def push_public_snapshot(public_remote, public_branch, commit_sha):
-    log(f"→ Force-pushing snapshot commit {commit_sha[:7]} → {public_remote}/{public_branch}")
+PUBLIC_IGNORE_CACHE = "public-filter-cache.json"
+PUBLIC_FILTER_CACHE_MAX = 50000
+
+def glob_to_regex(pattern):
+    out, i = [], 0
+    while i < len(pattern):
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+        elif pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+        elif pattern[i] == "*":
+            out.append("[^/]*")
+            i += 1
+        elif pattern[i] == "?":
+            out.append("[^/]")
+            i += 1
+        elif pattern[i] == "[" and "]" in pattern[i + 2:]:
+            end = pattern.index("]", i + 2)
+            body = pattern[i + 1:end]
+            out.append("[" + ("^" + body[1:] if body.startswith("!") else body) + "]")
+            i = end + 1
+        else:
+            out.append(re.escape(pattern[i]))
+            i += 1
+    return "".join(out)
+
+class PublicIgnore:
+    """
+    Paths kept out of the public repo, in .gitignore syntax: `#` comments, `!` re-includes,
+    a trailing `/` matches directories only, a leading or inner `/` anchors to the repo root,
+    and `*`, `?`, `[...]`, `**` glob. The last matching rule wins; as with .gitignore, nothing
+    below an excluded directory can be re-included.
+    """
+
+    def __init__(self, text):
+        self.digest = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        self.rules = []
+        for line in text.splitlines():
+            line = line.rstrip()
+            if not line or line.startswith("#"):
+                continue
+            negate = line.startswith("!")
+            if negate:
+                line = line[1:]
+            elif line.startswith("\\"):
+                line = line[1:]
+            dir_only = line.endswith("/")
+            line = line.rstrip("/")
+            anchored = "/" in line
+            rx = ("^" if anchored else "(?:^|.*/)") + glob_to_regex(line.lstrip("/")) + "$"
+            self.rules.append((re.compile(rx), negate, dir_only))
+
+    def excluded(self, path, is_dir):
+        result = False
+        for rx, negate, dir_only in self.rules:
+            if (is_dir or not dir_only) and rx.match(path):
+                result = not negate
+        return result
+
+class PublicTreeFilter:
+    """
+    Rewrites trees without the paths a PublicIgnore excludes, from git objects only: trees are read
+    through the session's `cat-file --batch` and new ones written by one `git mktree --batch`.
+    Subtrees with nothing excluded keep their SHA and are not rewritten. Results are cached by
+    (tree SHA, path) in .git/public-filter-cache.json, so the next run only revisits changed trees
+    (a cached top-level tree skips its subtrees, so older entries are kept up to a cap).
+    """
+
+    def __init__(self, ignore, cache_path):
+        self.ignore = ignore
+        self.cache_path = cache_path
+        self.cache = {}
+        self.used = {}
+        self.stats = {"visited": 0, "cached": 0, "written": 0, "excluded": 0}
+        self._mktree = None
+        try:
+            with open(cache_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("rules") == ignore.digest:
+                self.cache = data.get("trees", {})
+        except (OSError, ValueError, AttributeError):
+            pass
+
+    def apply(self, tree, prefix=""):
+        key = f"{tree} {prefix}"
+        hit = self.used.get(key) or self.cache.get(key)
+        # A cached result must still exist (gc may have pruned trees of old snapshots)
+        empty = git_session().empty_tree()
+        if hit and (hit == tree or hit == empty or git_session().resolve(hit)):
+            self.stats["cached"] += 1
+            self.used[key] = hit
+            return hit
+        self.stats["visited"] += 1
+        kept, changed = [], False
+        for mode, name, sha in git_session().read_tree(tree):
+            path = prefix + name
+            is_dir = mode == "40000"
+            if self.ignore.excluded(path, is_dir):
+                self.stats["excluded"] += 1
+                changed = True
+                continue
+            if is_dir:
+                filtered = self.apply(sha, path + "/")
+                changed = changed or filtered != sha
+                if filtered == empty:
+                    continue
+                sha = filtered
+            kept.append((mode, name, sha))
+        result = self._write(kept) if changed else tree
+        self.used[key] = result
+        return result
+
+    def _write(self, entries):
+        if not entries:
+            return git_session().empty_tree()
+        if self._mktree is None:
+            count_spawn()
+            if VERBOSE:
+                log("$ git mktree -z --batch  (filter)")
+            self._mktree = subprocess.Popen(["git", "mktree", "-z", "--batch"], stdin=subprocess.PIPE,
+                                            stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=REPO_DIR.get())
+        kinds = {"40000": "tree", "160000": "commit"}
+        batch = b"".join(f"{mode} {kinds.get(mode, 'blob')} {sha}\t{name}".encode("utf-8", "surrogateescape") + b"\0"
+                         for mode, name, sha in entries)
+        self._mktree.stdin.write(batch + b"\0")
+        self._mktree.stdin.flush()
+        sha = self._mktree.stdout.readline().decode("ascii").strip()
+        if not sha:
+            raise RuntimeError(f"git mktree failed: {self._mktree.stderr.read().decode('utf-8', 'replace').strip()}")
+        self.stats["written"] += 1
+        return sha
+
+    def close(self):
+        if self._mktree:
+            self._mktree.stdin.close()
+            self._mktree.wait(timeout=10)
+            self._mktree = None
+        # A hit on a parent tree skips its children, so keep older entries too, newest last, up to a cap
+        trees = {k: v for k, v in self.cache.items() if k not in self.used}
+        trees.update(self.used)
+        trees = dict(list(trees.items())[-PUBLIC_FILTER_CACHE_MAX:])
+        try:
+            tmp = f"{self.cache_path}.{os.getpid()}.tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump({"rules": self.ignore.digest, "trees": trees}, f)
+            os.replace(tmp, self.cache_path)
+        except OSError as e:
+            log(f"⚠️ Could not save {self.cache_path}: {e}")
+
+def load_public_filter(repo_root, ignore_file):
+    """PublicTreeFilter for the repo's --public-ignore file, or None if there is none."""
+    path = os.path.join(repo_root, ignore_file) if ignore_file else None
+    if not path or not os.path.isfile(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        ignore = PublicIgnore(f.read())
+    if not ignore.rules:
+        return None
+    _, _, git_dir, _ = git_session().layout()
+    return PublicTreeFilter(ignore, os.path.join(git_dir, PUBLIC_IGNORE_CACHE))
+
+@traced("filter public tree")
+def filter_public_tree(tree, public_filter):
+    if not public_filter:
+        return tree
+    public_filter.stats = dict.fromkeys(public_filter.stats, 0)
+    filtered = public_filter.apply(tree)
+    st = public_filter.stats
+    log(f"ℹ️ Public tree filtered: {st['excluded']} path(s) excluded; {st['visited']} tree(s) read, "
+        f"{st['written']} written, {st['cached']} reused from cache.")
+    return filtered
+
+@traced("public push")
+def push_public_commit(public_remote, public_branch, commit_sha, tag_name=None, force=False):
+    """
+    Publish the branch update and the release tag in one `git push --atomic`.
+
+    The tag is created locally first, so both refs travel in a single connection and
+    either both land or neither does.
+    """
+    if tag_name:
+        must(["git", "tag", "-f", "-a", tag_name, "-m", f"Release {tag_name}", commit_sha], f"Creating tag {tag_name}")
     # Some Git versions require fully-qualified destination ref
-    must(["git", "push", public_remote, f"{commit_sha}:refs/heads/{public_branch}", "--force"])
+    refspecs = [f"{'+' if force else ''}{commit_sha}:refs/heads/{public_branch}"]
+    if tag_name:
+        refspecs.append(f"+refs/tags/{tag_name}:refs/tags/{tag_name}")
+    verb = "Force-pushing" if force else "Pushing"
+    log(f"→ {verb} {commit_sha[:7]} → {public_remote}/{public_branch}" + (f" with tag {tag_name}" if tag_name else ""))
+    cmd = ["git", "push", "--atomic", public_remote, *refspecs]
+    r = run(cmd)
+    if r.returncode == 0:
+        if tag_name:
+            log(f"✓ Pushed tag {tag_name} → {public_remote}")
+        return
+    if tag_name and "does not support --atomic" in r.stderr:
+        # Old servers: branch first, then the tag (best effort, as before)
+        must(["git", "push", public_remote, refspecs[0]])
+        tag_and_push_public(tag_name, f"Release {tag_name}", commit_sha, public_remote)
+        return
+    raise remote_error(cmd, r)
+
+SYNC_STATE_PREFIX = "refs/sync-state"
+
+def sync_state_refs(public_remote, public_branch):
+    base = f"{SYNC_STATE_PREFIX}/{public_remote}/{public_branch}"
+    return f"{base}/public", f"{base}/private"
+
+def read_sync_state(public_remote, public_branch):
+    """(last known public tip, private commit it was published from); either may be None."""
+    pub_ref, priv_ref = sync_state_refs(public_remote, public_branch)
+    return git_session().resolve(pub_ref), git_session().resolve(priv_ref)
 
+def record_sync_state(public_remote, public_branch, public_commit, private_commit):
+    # The refs also keep the public tip reachable locally, so the next run can skip the fetch
+    pub_ref, priv_ref = sync_state_refs(public_remote, public_branch)
+    lines = [f"update {pub_ref} {public_commit}"]
+    if private_commit:
+        lines.append(f"update {priv_ref} {private_commit}")
+    r = run(["git", "update-ref", "--stdin"], input="\n".join(lines) + "\n")
+    if r.returncode != 0:
+        log(f"⚠️ Could not record sync state: {r.stderr.strip()}")
+
+def remote_branch_tip(public_remote, public_branch):
+    """
+    Ask the remote for the branch tip without downloading objects.
+    Returns the SHA, "" if the branch does not exist, or None if the remote could not be queried.
+    """
+    r = run(["git", "ls-remote", public_remote, f"refs/heads/{public_branch}"])
+    if r.returncode != 0:
+        return None
+    for line in r.stdout.splitlines():
+        sha, _, ref = line.partition("\t")
+        if ref.strip() == f"refs/heads/{public_branch}":
+            return sha.strip()
+    return ""
+
+@traced("public fetch")
 def fetch_public_tip(public_remote, public_branch):
-    r = run(["git", "fetch", public_remote, public_branch])
+    """
+    Make the public tip available locally and return its SHA (None if the branch is missing).
+
+    The fetch is skipped when the remote tip matches the recorded sync state. It is a plain
+    fetch: --depth/--filter would turn the private repo into a shallow partial clone.
+    """
+    known_tip, _ = read_sync_state(public_remote, public_branch)
+    remote_tip = remote_branch_tip(public_remote, public_branch)
+    if remote_tip == "":
+        return None
+    if remote_tip and remote_tip == known_tip:
+        log(f"ℹ️ Public tip {remote_tip[:7]} unchanged since last sync; skipping fetch.")
+        return remote_tip
+    cmd = ["git", "fetch", "--no-tags", public_remote, public_branch]
+    r = run(cmd)
     if r.returncode != 0:
+        if remote_tip is None and "couldn't find remote ref" in r.stderr.lower():
+            return None
+        # The branch exists (or ls-remote could not tell): initializing with a snapshot
+        # would overwrite the public history
+        raise remote_error(cmd, r)
+    return git_session().resolve("FETCH_HEAD")
+
+WORKTREE_CACHE_NAME = "public-sync-worktree"
+WORKTREE_LOCK_STALE_SECS = 3600
+
+def pid_alive(pid):
+    """True unless `pid` is known to have exited (errs toward alive)."""
+    if os.name == "nt":
+        # os.kill(pid, 0) would send CTRL_C_EVENT or terminate the process on Windows
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return kernel32.GetLastError() != 87  # ERROR_INVALID_PARAMETER: no such process
+        try:
+            code = ctypes.c_ulong()
+            if not kernel32.GetExitCodeProcess(handle, ctypes.byref(code)):
+                return True
+            return code.value == 259  # STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
         return False
+    except OSError:
+        pass
     return True
 
-def cherry_pick_last_to_public(public_remote, public_branch, last_commit):
-    # Create a temporary worktree at FETCH_HEAD and cherry-pick the last commit
-    worktree_dir = tempfile.mkdtemp(prefix="public_sync_")
+class WorktreeLock:
+    """Exclusive lock file next to the cached worktree; stale locks from dead runs are broken."""
+
+    def __init__(self, path, timeout=120):
+        self.path = path
+        self.timeout = timeout
+
+    def _is_stale(self):
+        try:
+            age = time.time() - os.stat(self.path).st_mtime
+            with open(self.path, "r", encoding="utf-8") as f:
+                pid_s, _, started_s = f.read().strip().partition(" ")
+        except OSError:
+            return False  # released meanwhile (or unreadable); the next O_EXCL attempt decides
+        try:
+            pid, started = int(pid_s), float(started_s)
+        except ValueError:
+            # Empty or partial: the owner may not have written its pid yet, so judge by age only
+            return age > WORKTREE_LOCK_STALE_SECS
+        if time.time() - started > WORKTREE_LOCK_STALE_SECS:
+            return True
+        return not pid_alive(pid)
+
+    def __enter__(self):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            except FileExistsError:
+                if self._is_stale():
+                    log(f"ℹ️ Breaking stale worktree lock {self.path}")
+                    try:
+                        os.remove(self.path)
+                    except OSError:
+                        pass
+                    continue
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"Timed out waiting for worktree lock {self.path}")
+                time.sleep(0.2)
+                continue
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(f"{os.getpid()} {time.time()}")
+            return self
+
+    def __exit__(self, *exc):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+def dir_size_bytes(path):
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+def cached_worktree_is_healthy(worktree_dir, common_dir):
+    # The worktree's .git file and the admin dir under .git/worktrees must point at each other
+    admin_dir = os.path.join(common_dir, "worktrees", os.path.basename(worktree_dir))
     try:
-        must(["git", "worktree", "add", "--detach", worktree_dir, "FETCH_HEAD"], "Adding temporary worktree at FETCH_HEAD for public sync")
-        # Perform operations inside the worktree
-        def wt(*args):
-            return must(["git", "-C", worktree_dir, *args])
+        with open(os.path.join(worktree_dir, ".git"), "r", encoding="utf-8") as f:
+            link = f.read().strip()
+        with open(os.path.join(admin_dir, "gitdir"), "r", encoding="utf-8") as f:
+            back = f.read().strip()
+    except OSError:
+        return False
+    return (link == f"gitdir: {admin_dir}"
+            and os.path.normpath(back) == os.path.normpath(os.path.join(worktree_dir, ".git"))
+            and os.path.isfile(os.path.join(admin_dir, "HEAD")))
+
+def drop_worktree(worktree_dir):
+    run(["git", "worktree", "remove", "--force", worktree_dir])
+    shutil.rmtree(worktree_dir, ignore_errors=True)
+    run(["git", "worktree", "prune"])
 
+def checkout_public_worktree(worktree_dir, common_dir, tip):
+    # Reuse the cached worktree when it is intact: reset only rewrites files that differ from tip
+    if cached_worktree_is_healthy(worktree_dir, common_dir):
+        reset = run(["git", "-C", worktree_dir, "reset", "-q", "--hard", tip])
+        if reset.returncode == 0:
+            clean = run(["git", "-C", worktree_dir, "clean", "-q", "-f", "-d", "-x"])
+            if clean.returncode == 0:
+                log("ℹ️ Reusing cached public worktree (incremental reset).")
+                return
+        log("⚠️ Cached public worktree is corrupt; rebuilding.")
+        drop_worktree(worktree_dir)
+    elif os.path.exists(worktree_dir):
+        log("⚠️ Cached public worktree is not registered correctly; rebuilding.")
+        drop_worktree(worktree_dir)
+    else:
+        # First run, or the directory was deleted behind git's back
+        run(["git", "worktree", "prune"])
+    must(["git", "worktree", "add", "--detach", worktree_dir, tip], "Adding cached worktree for public sync")
+
+@traced("worktree cherry-pick")
+def cherry_pick_last_to_public(public_remote, public_branch, last_commit, tip, cache_max_mb=512):
+    # Returns the SHA of the new public commit (not pushed yet)
+    _, _, _, common_dir = git_session().layout()
+
+    if cache_max_mb <= 0:
+        # Cache disabled: throwaway worktree, removed after the push
+        worktree_dir = tempfile.mkdtemp(prefix="public_sync_")
         try:
-            wt("cherry-pick", last_commit)
-        except Exception as e:
-            # Attempt to abort cherry-pick on failure to leave worktree clean
-            run(["git", "-C", worktree_dir, "cherry-pick", "--abort"])  # best effort
-            raise
+            must(["git", "worktree", "add", "--detach", worktree_dir, tip], "Adding temporary worktree at public tip for public sync")
+            return cherry_pick_in_worktree(worktree_dir, public_remote, public_branch, last_commit)
+        finally:
+            # Clean up worktree directory
+            try:
+                must(["git", "worktree", "remove", "--force", worktree_dir], "Removing temporary worktree")
+            except Exception:
+                # If git fails to remove, try filesystem removal
+                shutil.rmtree(worktree_dir, ignore_errors=True)
 
-        # Push only this one commit (HEAD in worktree) to public branch
-        wt("push", public_remote, f"HEAD:refs/heads/{public_branch}")
-        log("✓ Pushed one cherry-picked commit to public.")
-    finally:
-        # Clean up worktree directory
+    # Warm worktree kept under .git between runs
+    worktree_dir = os.path.join(common_dir, WORKTREE_CACHE_NAME)
+    with WorktreeLock(worktree_dir + ".lock"):
+        checkout_public_worktree(worktree_dir, common_dir, tip)
         try:
-            must(["git", "worktree", "remove", "--force", worktree_dir], "Removing temporary worktree")
-        except Exception:
-            # If git fails to remove, try filesystem removal
-            shutil.rmtree(worktree_dir, ignore_errors=True)
+            return cherry_pick_in_worktree(worktree_dir, public_remote, public_branch, last_commit)
+        finally:
+            if dir_size_bytes(worktree_dir) > cache_max_mb * 1024 * 1024:
+                log(f"ℹ️ Cached public worktree exceeds {cache_max_mb} MB; dropping it.")
+                drop_worktree(worktree_dir)
+
+class CherryPickFailed(RuntimeError):
+    """`git cherry-pick` itself failed in a working worktree (e.g. a conflict); the only case that falls back to a snapshot."""
+
+def cherry_pick_in_worktree(worktree_dir, public_remote, public_branch, last_commit):
+    # Perform operations inside the worktree
+    def wt(*args):
+        return must(["git", "-C", worktree_dir, *args])
+
+    try:
+        wt("cherry-pick", last_commit)
+    except Exception as e:
+        # Attempt to abort cherry-pick on failure to leave worktree clean
+        run(["git", "-C", worktree_dir, "cherry-pick", "--abort"])  # best effort
+        raise CherryPickFailed(str(e)) from e
+
+    # The worktree shares the object store, so the caller pushes this commit from the main repo
+    new_commit = wt("rev-parse", "HEAD")
+    log(f"✓ Cherry-picked one commit onto public tip: {new_commit[:7]}")
+    return new_commit
+
+EMPTY_TREE = "4b825dc642cb6eb9a060e54bf8d69288fbee4904"
+EMPTY_TREE_SHA256 = "6ef19b41225c5369f1c104d45d8d85efa9b057b53b14b4b9b939dd74decc5321"
+
+class MergeConflict(RuntimeError):
+    pass
+
+def replay_tree_in_memory(tip, last_commit, public_filter=None, since=None):
+    """
+    Tree of `last_commit` replayed onto `tip` (what cherry-pick would produce),
+    computed from git objects only. Raises MergeConflict if a real merge is needed.
+
+    `since` replays everything after that commit instead of just `last_commit`'s own change.
+    With a public filter, the change is replayed between the filtered trees of `last_commit`
+    and its parent, so edits to excluded paths (absent on public) are not conflicts; the
+    result is filtered again, since the merge keeps excluded paths that `tip` still has.
+    """
+    parent = since or git_session().resolve(f"{last_commit}^")
+    base, theirs = parent or git_session().empty_tree(), last_commit
+    if public_filter:
+        base = filter_public_tree(git_session().resolve(f"{base}^{{tree}}"), public_filter)
+        theirs = filter_public_tree(git_session().resolve(f"{last_commit}^{{tree}}"), public_filter)
+    elif parent:
+        r = run(["git", "merge-tree", "--write-tree", "--no-messages", f"--merge-base={parent}", tip, last_commit])
+        if r.returncode == 0:
+            return r.stdout.split("\n", 1)[0].strip()
+        if r.returncode == 1:
+            raise MergeConflict(f"merge-tree reported conflicts:\n{r.stdout.strip()}")
+        # Exit 129: Git older than 2.40 has no --merge-base; use a trivial index merge instead
+
+    # Three-way read-tree into a throwaway index: resolves paths touched on one side only
+    with tempfile.TemporaryDirectory(prefix="public_merge_") as tmp:
+        env = os.environ.copy()
+        env["GIT_INDEX_FILE"] = os.path.join(tmp, "index")
+        must(["git", "read-tree", "-m", "-i", "--aggressive", base, tip, theirs],
+             "Merging trees into temp index", env=env)
+        r = run(["git", "write-tree"], env=env)
+        if r.returncode != 0:
+            raise MergeConflict(f"index merge left unmerged paths:\n{r.stderr.strip()}")
+    tree = r.stdout.strip()
+    return filter_public_tree(tree, public_filter) if public_filter else tree
+
+@traced("in-memory cherry-pick")
+def cherry_pick_in_memory(public_remote, public_branch, last_commit, tip, public_filter=None, since=None):
+    """Create the single public commit without any worktree; returns its SHA (not pushed yet)."""
+    tree = replay_tree_in_memory(tip, last_commit, public_filter, since)
+    if tree == git_session().resolve(f"{tip}^{{tree}}"):
+        log("ℹ️ Latest commit introduces no changes on public; nothing to push.")
+        return tip
+    new_commit = commit_tree_like(tree, tip, last_commit)
+    log(f"✓ Built one commit {new_commit[:7]} on public tip (in-memory merge, no worktree).")
+    return new_commit
+
+def refilter_commit(commit, parent, public_filter):
+    """`commit` with excluded paths removed from its tree (re-created on `parent` if anything changes)."""
+    tree = git_session().resolve(f"{commit}^{{tree}}")
+    filtered = filter_public_tree(tree, public_filter)
+    if filtered == tree:
+        return commit
+    if filtered == git_session().resolve(f"{parent}^{{tree}}"):
+        log("ℹ️ Latest commit only touches excluded paths; nothing to push.")
+        return parent
+    return commit_tree_like(filtered, parent, commit)
+
+def commit_tree_like(tree, parent, source_commit):
+    # Like cherry-pick: keep the original author and message, commit as the current user
+    info = git_session().commit_info(source_commit) or {}
+    env = os.environ.copy()
+    for key, var in (("author_name", "GIT_AUTHOR_NAME"), ("author_email", "GIT_AUTHOR_EMAIL"),
+                     ("author_date", "GIT_AUTHOR_DATE")):
+        if info.get(key):
+            env[var] = info[key]
+    message = info.get("message", "").strip() or "Public update"
+    return must(["git", "commit-tree", tree, "-p", parent, "-m", message], "Creating public commit", env=env)
 
 def read_version_from_package_json(repo_root: str) -> str | None:
     try:
@@ -235,6 +1341,7 @@ def read_version_from_package_json(repo_root: str) -> str | None:
 def ensure_tag_prefix(version: str) -> str:
     return version if version.startswith('v') else f"v{version}"
 
+@traced("tag push")
 def tag_and_push_public(tag_name: str, message: str, commit_sha: str, public_remote: str):
     # Create/overwrite local annotated tag pointing to commit_sha, then push tag to public
     try:
@@ -244,128 +1351,510 @@ def tag_and_push_public(tag_name: str, message: str, commit_sha: str, public_rem
     except Exception as e:
         log(f"⚠️ Failed to push tag {tag_name}: {e}")
 
+def private_remotes(args):
+    """--private-remote may be repeated or comma-separated (config: string or list)."""
+    value = args.private_remote
+    items = value if isinstance(value, (list, tuple)) else [value]
+    remotes = [name.strip() for item in items if item for name in str(item).split(",") if name.strip()]
+    return remotes or ["private"]
+
+def private_urls(args):
+    value = args.private_url
+    if value is None:
+        return []
+    return list(value) if isinstance(value, (list, tuple)) else [value]
+
+@traced("private pipeline")
+def sync_private(remote, branch, unborn, before_push=None):
+    # 1) Private push (only if we have history)
+    if unborn:
+        log("ℹ️ Repo has no commits yet; skipping private push (nothing to push).")
+        return "skipped (no commits yet)."
+    if before_push:
+        before_push()
+    sent, secs = push_full_history(remote, branch)
+    return f"full history updated ({format_bytes(sent)} in {secs:.1f}s)."
+
+def shared_pack_once(mirror_count):
+    # Returns a callable that packs loose objects the first time any mirror pipeline calls it
+    if mirror_count < 2:
+        return None
+    lock = threading.Lock()
+    done = []
+
+    def prepare():
+        with lock:
+            if not done:
+                done.append(True)
+                with trace_span("shared pack"):
+                    prepare_shared_pack()
+    return prepare
+
+@traced("public pipeline")
+def publish_public(args, repo_root, unborn):
+    # --public-ignore (.publicignore): paths filtered out of every public tree
+    public_filter = load_public_filter(repo_root, args.public_ignore)
+    try:
+        return update_public(args, repo_root, unborn, public_filter)
+    finally:
+        if public_filter:
+            public_filter.close()
+
+def update_public(args, repo_root, unborn, public_filter):
+    # 2) Public update
+    last_local = None if unborn else git_session().resolve("HEAD")
+    # Release tag v<version> (if package.json has one) goes out in the same push as the branch
+    version = read_version_from_package_json(repo_root)
+    tag_name = ensure_tag_prefix(version) if version else None
+
+    def publish_snapshot(pub_commit):
+        push_public_commit(args.public_remote, args.public_branch, pub_commit, tag_name, force=True)
+        record_sync_state(args.public_remote, args.public_branch, pub_commit, last_local)
+
+    if args.public_mode == "snapshot":
+        # Keep existing behavior (force replace with a single commit)
+        msg = args.public_message or f"Public version: {last_commit_msg_or('snapshot')}"
+        env = author_env(args.preserve_author)
+        if unborn:
+            log("→ Building public snapshot from WORKING TREE (temporary index)…")
+            pub_commit = make_root_commit_from_worktree(msg, repo_root, env_overrides=env, public_filter=public_filter)
+        else:
+            log("→ Building public snapshot from HEAD tree…")
+            pub_commit = make_root_commit_from_head_tree(msg, env_overrides=env, public_filter=public_filter)
+        publish_snapshot(pub_commit)
+        return "replaced with exactly one commit (fresh snapshot)."
+
+    # Cherry-pick only the latest local commit onto the public tip
+    if unborn:
+        # No local commits to cherry-pick; publish a snapshot commit (first-time init)
+        log("ℹ️ Unborn HEAD locally; falling back to snapshot for public initialization.")
+        msg = args.public_message or "Public version: initial snapshot"
+        env = author_env(args.preserve_author)
+        publish_snapshot(make_root_commit_from_worktree(msg, repo_root, env_overrides=env, public_filter=public_filter))
+        return "initialized via snapshot (no local commits yet)."
+
+    # Determine last local commit
+    if not last_local:
+        raise RuntimeError("Getting last local commit failed")
+
+    # Fetch public tip; if missing, initialize via snapshot to avoid pushing full history
+    known_tip, known_source = read_sync_state(args.public_remote, args.public_branch)
+    tip = fetch_public_tip(args.public_remote, args.public_branch)
+    if not tip:
+        log(f"ℹ️ Public branch '{args.public_branch}' not found. Initializing with snapshot (one commit).")
+        msg = args.public_message or f"Public version: {last_commit_msg_or('snapshot')}"
+        env = author_env(args.preserve_author)
+        publish_snapshot(make_root_commit_from_head_tree(msg, env_overrides=env, public_filter=public_filter))
+        return "initialized via snapshot (public branch was missing)."
+    if tip == known_tip and known_source == last_local:
+        log(f"ℹ️ Public tip {tip[:7]} already carries {last_local[:7]}; nothing to publish.")
+        return "already up to date."
+
+    # Several commits since the last publish (e.g. a --watch burst): replay them together as one
+    # change; cherry-picking only the newest would conflict with the ones before it
+    since = None
+    if known_tip == tip and known_source and known_source != git_session().resolve(f"{last_local}^"):
+        if run(["git", "merge-base", "--is-ancestor", known_source, last_local]).returncode == 0:
+            since = known_source
+            log(f"ℹ️ Publishing all changes since {known_source[:7]} as one commit.")
+
+    try:
+        pub_tip = None
+        # A worktree cherry-pick cannot skip excluded paths or replay a range, so try in memory first
+        if args.public_mode == "merge-tree" or public_filter or since:
+            try:
+                pub_tip = cherry_pick_in_memory(args.public_remote, args.public_branch, last_local, tip,
+                                                public_filter, since)
+            except MergeConflict as e:
+                log(f"ℹ️ In-memory merge needs conflict handling; using the worktree cherry-pick. {e}")
+        if pub_tip is None:
+            pub_tip = cherry_pick_last_to_public(args.public_remote, args.public_branch, last_local, tip,
+                                                 cache_max_mb=args.worktree_cache_max_mb)
+            if public_filter:
+                pub_tip = refilter_commit(pub_tip, tip, public_filter)
+        # The new commit's SHA is known locally: branch and tag go out in one atomic push
+        push_public_commit(args.public_remote, args.public_branch, pub_tip, tag_name)
+        record_sync_state(args.public_remote, args.public_branch, pub_tip, last_local)
+        return "updated by cherry-picking the latest commit onto public tip."
+    except CherryPickFailed as e:
+        # Only a failed cherry-pick falls back. Worktree, lock and network errors propagate: a
+        # snapshot force-push would replace the public history over a local or transient problem
+        log(f"⚠️ Cherry-pick to public failed; falling back to snapshot. Reason: {e}")
+        msg = args.public_message or f"Public version: {last_commit_msg_or('snapshot')}"
+        env = author_env(args.preserve_author)
+        publish_snapshot(make_root_commit_from_head_tree(msg, env_overrides=env, public_filter=public_filter))
+        return "replaced with a snapshot commit (cherry-pick failed)."
+
+def run_pipelines(pipelines):
+    """
+    Run independent remote pipelines concurrently.
+
+    `pipelines` is a list of (label, fn) pairs; each fn runs in its own thread with
+    log lines prefixed by its label. Returns {label: (ok, result_or_error)} so a
+    failure on one remote is reported without hiding the outcome of the others.
+    """
+    def call(label, fn):
+        LOG_PREFIX.set(LOG_PREFIX.get() + f"[{label}] ")
+        return fn()
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(1, len(pipelines))) as pool:
+        futures = [(label, pool.submit(contextvars.copy_context().run, call, label, fn))
+                   for label, fn in pipelines]
+        for label, fut in futures:
+            try:
+                results[label] = (True, fut.result())
+            except Exception as e:
+                results[label] = (False, e)
+    return results
+
+REPO_OPTION_DEFAULTS = {
+    "private_remote": ["private"],
+    "private_url": None,
+    "public_remote": "public",
+    "public_url": None,
+    "branch": None,
+    "public_branch": "main",
+    "public_message": None,
+    "preserve_author": False,
+    "public_mode": "cherry-pick",
+    "worktree_cache_max_mb": 512,
+    "public_ignore": ".publicignore",
+}
+
+def load_sync_config(path, cli_args):
+    """
+    Read a --config JSON file into a list of (label, repo_path, options, timeout).
+
+    {"defaults": {...}, "repos": [{"path": "../site", "public_mode": "merge-tree", ...}, ...]}
+
+    Keys are the long option names (dashes or underscores). Options come from the repo
+    entry, then "defaults", then the command line; "timeout" (seconds) bounds one repo's sync.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(path))
+
+    def normalized(d):
+        return {str(k).replace("-", "_"): v for k, v in (d or {}).items()}
+
+    defaults = normalized(data.get("defaults"))
+    jobs = []
+    for entry in data.get("repos", []):
+        entry = normalized(entry)
+        if not entry.get("path"):
+            raise ValueError(f"{path}: every repo entry needs a 'path'")
+        repo_path = os.path.normpath(os.path.join(base_dir, os.path.expanduser(entry["path"])))
+        opts = {k: getattr(cli_args, k, v) for k, v in REPO_OPTION_DEFAULTS.items()}
+        for source in (defaults, entry):
+            unknown = set(source) - set(REPO_OPTION_DEFAULTS) - {"path", "name", "timeout"}
+            if unknown:
+                raise ValueError(f"{path}: unknown option(s) {', '.join(sorted(unknown))}")
+            opts.update({k: v for k, v in source.items() if k in REPO_OPTION_DEFAULTS})
+        timeout = entry.get("timeout", defaults.get("timeout", cli_args.repo_timeout))
+        label = entry.get("name") or os.path.basename(repo_path)
+        jobs.append((label, repo_path, argparse.Namespace(**opts), timeout))
+    return jobs
+
+def prepare_repo(args):
+    """
+    Check the repository and its remotes (adding missing ones from the URL flags).
+    Returns (repo_root, mirrors, {mirror: url}, public url); exits if a remote has no URL.
+    """
+    ensure_repo()
+    repo_root = git_top_level()
+
+    mirrors = private_remotes(args)
+    urls = private_urls(args)
+    for i, mirror in enumerate(mirrors):
+        ensure_remote(mirror, "private-url", urls[i] if i < len(urls) else None)
+    ensure_remote(args.public_remote,  "public-url",  args.public_url)
+
+    priv_urls = {mirror: remote_url(mirror) for mirror in mirrors}
+    pub_url  = remote_url(args.public_remote)
+    for mirror, url in priv_urls.items():
+        if not url: sys.exit(f"❌ Remote '{mirror}' missing URL.")
+    if not pub_url:  sys.exit(f"❌ Remote '{args.public_remote}' missing URL.")
+    REMOTE_ENV.set(remote_env_for_repo([*priv_urls.values(), pub_url]))
+    return repo_root, mirrors, priv_urls, pub_url
+
+@traced("sync repo")
+def sync_repo(args, prepared=None):
+    """
+    Sync the repository of the current context: private push and public update.
+    `prepared` is a prepare_repo() result to reuse (--watch); by default the remotes are checked first.
+    Returns {"private": [(label, ok, outcome), ...one per mirror], "public": [(label, ok, outcome)]}.
+    """
+    repo_root, mirrors, priv_urls, pub_url = prepared or prepare_repo(args)
+    unborn = is_unborn_head()
+    branch = args.branch or current_branch_guess()
+
+    log("✅ Remotes:")
+    for mirror, url in priv_urls.items():
+        log(f"   {mirror}: {url}")
+    log(f"   {args.public_remote}: {pub_url}")
+    log(f"✅ Branch (private full history): {branch} ({'unborn' if unborn else 'ok'})")
+    log(f"✅ Public branch (single commit): {args.public_branch}")
+    log("")
+
+    # Private mirrors and the public update talk to different remotes; run them side by side
+    before_push = shared_pack_once(len(mirrors))
+    private_labels = [f"private:{mirror}" for mirror in mirrors]
+    public_label  = f"public:{args.public_remote}"
+    pipelines = [(label, lambda mirror=mirror: sync_private(mirror, branch, unborn, before_push))
+                 for label, mirror in zip(private_labels, mirrors)]
+    pipelines.append((public_label, lambda: publish_public(args, repo_root, unborn)))
+    results = run_pipelines(pipelines)
+    return {"private": [(label, *results[label]) for label in private_labels],
+            "public":  [(public_label, *results[public_label])]}
+
+def sync_one_in_context(label, repo_path, args, timeout):
+    # Runs in a copied context: own cwd, git session, deadline and log prefix
+    REPO_DIR.set(repo_path)
+    _SESSION.set(GitSession(cwd=repo_path))
+    LOG_PREFIX.set(f"[{label}] ")
+    if timeout:
+        DEADLINE.set(time.monotonic() + float(timeout))
+    try:
+        return sync_repo(args)
+    except SystemExit as e:
+        # ensure_repo()/ensure_remote() exit the process in single-repo mode; here it is one failure
+        raise RuntimeError(str(e.code))
+    finally:
+        git_session().close()
+
+def sync_many(jobs, max_workers):
+    """Sync every configured repo on a bounded pool; returns the process exit status."""
+    started = {}
+    rows = []
+    with ThreadPoolExecutor(max_workers=max(1, max_workers)) as pool:
+        futures = {}
+        for label, repo_path, args, timeout in jobs:
+            started[label] = time.monotonic()
+            fut = pool.submit(contextvars.copy_context().run, sync_one_in_context, label, repo_path, args, timeout)
+            futures[fut] = (label, args)
+        for fut in as_completed(futures):
+            label, args = futures[fut]
+            elapsed = time.monotonic() - started[label]
+            try:
+                res = fut.result()
+                rows.append((label, args.public_mode, res["private"], res["public"], elapsed))
+            except Exception as e:
+                err = [(None, False, e)]
+                rows.append((label, args.public_mode, err, err, elapsed))
+
+    def cell(entries):
+        parts = []
+        for entry_label, ok, outcome in entries:
+            text = str(outcome).strip().splitlines()[0] if str(outcome).strip() else ""
+            who = f"{entry_label.split(':', 1)[1]} " if len(entries) > 1 and entry_label else ""
+            parts.append(who + ("ok: " if ok else "FAILED: ") + text)
+        return "; ".join(parts)
+
+    order = {label: i for i, (label, *_rest) in enumerate(jobs)}
+    rows.sort(key=lambda r: order[r[0]])
+    log("\n📋 Summary")
+    header = ("Repo", "Mode", "Private", "Public", "Time")
+    table = [header] + [(label, mode, cell(priv), cell(pub), f"{elapsed:.1f}s")
+                        for label, mode, priv, pub, elapsed in rows]
+    widths = [min(60, max(len(r[i]) for r in table)) for i in range(len(header))]
+    for r in table:
+        log("   " + "  ".join(c[:widths[i]].ljust(widths[i]) for i, c in enumerate(r)).rstrip())
+    log(f"   Git processes spawned: {SPAWN_COUNT}; remote round trips: {ROUND_TRIPS}")
+
+    failed = sum(1 for _, _, priv, pub, _ in rows if not all(ok for _, ok, _ in priv + pub))
+    if failed == 0:
+        return 0
+    # 1: nothing synced cleanly; 2: partial failure (some repos or one side of a repo)
+    return 1 if failed == len(rows) else 2
+
 def parse_args():
     p = argparse.ArgumentParser(description="Push full history to private and single-commit snapshot to public.")
-    p.add_argument("--private-remote", default="private")
-    p.add_argument("--private-url", help="URL if 'private' remote is missing")
+    p.add_argument("--private-remote", action="append",
+                   help="Private remote(s); repeat or comma-separate to mirror to several (default: private)")
+    p.add_argument("--private-url", action="append", help="URL if the private remote is missing (one per --private-remote, in order)")
     p.add_argument("--public-remote", default="public")
     p.add_argument("--public-url", help="URL if 'public' remote is missing")
     p.add_argument("--branch", help="Branch to push to private (default: current)")
     p.add_argument("--public-branch", default="main")
     p.add_argument("--public-message", help="Public commit message override")
     p.add_argument("--preserve-author", action="store_true", help="Preserve author/committer from HEAD or git config")
-    p.add_argument("--public-mode", choices=["cherry-pick", "snapshot"], default="cherry-pick",
-                   help="How to update public: cherry-pick latest commit (default) or snapshot from HEAD tree")
+    p.add_argument("--public-mode", choices=["cherry-pick", "merge-tree", "snapshot"], default="cherry-pick",
+                   help="How to update public: cherry-pick latest commit (default), the same without a worktree "
+                        "(merge-tree), or snapshot from HEAD tree")
+    p.add_argument("--worktree-cache-max-mb", type=int, default=512,
+                   help="Keep the cherry-pick worktree under .git between runs, up to this size (0 = temporary worktree each run)")
+    p.add_argument("--public-ignore", default=".publicignore", metavar="FILE",
+                   help="Paths to leave out of the public tree, .gitignore syntax (default: .publicignore; ignored if missing)")
+    p.add_argument("--watch", action="store_true",
+                   help="Keep running and sync whenever the branch gets new commits (Ctrl-C to stop)")
+    p.add_argument("--watch-poll", type=float, default=2, help="With --watch, seconds between ref checks (default: 2)")
+    p.add_argument("--debounce", type=float, default=10,
+                   help="With --watch, wait until the branch has been still this many seconds (default: 10)")
+    p.add_argument("--min-interval", type=float, default=60,
+                   help="With --watch, start at most one sync per this many seconds (default: 60)")
+    p.add_argument("--config", help="JSON file listing repos to sync (see load_sync_config); other flags become defaults")
+    p.add_argument("--jobs", type=int, default=4, help="Repos synced at once with --config (default: 4)")
+    p.add_argument("--repo-timeout", type=float, default=900, help="Per-repo time limit in seconds with --config (default: 900)")
+    p.add_argument("--retries", type=int, default=3,
+                   help="Retries for a push/fetch that fails with a transient network error (default: 3)")
+    p.add_argument("--retry-delay", type=float, default=0.5,
+                   help="First retry delay in seconds; doubles per attempt, with jitter (default: 0.5)")
+    p.add_argument("--no-share-connections", dest="share_connections", action="store_false",
+                   help="Do not share one SSH connection per host (ControlMaster) across the run's git commands")
+    p.add_argument("--trace", metavar="FILE", help="Write a Chrome trace-event JSON of every git command and phase")
+    p.add_argument("--trace-top", type=int, default=10, help="With --trace, list this many slowest steps at the end")
     p.add_argument("--verbose", action="store_true", help="Print commands and outputs for debugging")
+    p.add_argument("--log-max-mb", type=float, default=5, help="Rotate sync_repos.log past this size (default: 5)")
+    p.add_argument("--log-max-age-days", type=float, default=7, help="Rotate sync_repos.log after this many days (default: 7)")
+    p.add_argument("--log-backups", type=int, default=5, help="Rotated log files to keep (default: 5)")
+    p.add_argument("--log-max-output", type=int, default=4096,
+                   help="Bytes of --verbose command output stored per log record (default: 4096)")
+    p.add_argument("--log-output", choices=["truncate", "compress"], default="truncate",
+                   help="Larger output is truncated (head/tail) or stored zlib-compressed as base64")
     return p.parse_args()
 
 def main():
-    ensure_repo()
-    repo_root = git_top_level()
     args = parse_args()
 
-    global VERBOSE
+    global VERBOSE, TRACER, LOG_MAX_OUTPUT, LOG_OUTPUT_MODE, RETRIES, RETRY_BASE_DELAY
     VERBOSE = bool(args.verbose)
+    RETRIES = max(0, args.retries)
+    RETRY_BASE_DELAY = max(0.0, args.retry_delay)
+    if args.share_connections:
+        start_connection_sharing()
+    LOG_MAX_OUTPUT = max(0, args.log_max_output)
+    LOG_OUTPUT_MODE = args.log_output
+    open_log(args.log_max_mb, args.log_max_age_days, args.log_backups)
+    if args.trace:
+        TRACER = Tracer()
+        if args.watch and not args.config:
+            # A watcher runs for days: sync_watched() writes and resets the trace after every sync
+            return run_main(args)
+        try:
+            with trace_span("sync_repos"):
+                return run_main(args)
+        finally:
+            write_trace(args.trace, args.trace_top)
+    return run_main(args)
 
-    ensure_remote(args.private_remote, "private-url", args.private_url)
-    ensure_remote(args.public_remote,  "public-url",  args.public_url)
+def write_trace(path, top):
+    try:
+        TRACER.write(path)
+    except OSError as e:
+        log(f"⚠️ Could not write trace {path}: {e}")
+        return
+    log(f"\n⏱️ Trace written to {path}.")
+    log("   Slowest phases:")
+    for e in TRACER.slowest(top, "phase"):
+        log(f"   {e['dur'] / 1e6:8.3f}s  {e['name']}")
+    log("   Slowest commands:")
+    for e in TRACER.slowest(top, "git"):
+        a = e["args"]
+        out = f", {a['stdout_bytes'] + a['stderr_bytes']} B out" if "stdout_bytes" in a else ""
+        log(f"   {e['dur'] / 1e6:8.3f}s  {e['name']}  (exit {a.get('exit_code', '?')}{out})")
 
-    priv_url = remote_url(args.private_remote)
-    pub_url  = remote_url(args.public_remote)
-    if not priv_url: sys.exit(f"❌ Remote '{args.private_remote}' missing URL.")
-    if not pub_url:  sys.exit(f"❌ Remote '{args.public_remote}' missing URL.")
+def run_main(args):
+    if args.config:
+        if args.watch:
+            sys.exit("❌ --watch syncs a single repo; run one watcher per repo instead of --config.")
+        jobs = load_sync_config(args.config, args)
+        if not jobs:
+            sys.exit(f"❌ No repos listed in {args.config}.")
+        return sync_many(jobs, args.jobs)
 
-    unborn = is_unborn_head()
-    branch = args.branch or current_branch_guess()
+    if args.watch:
+        return watch(args)
 
-    log("✅ Remotes:")
-    log(f"   {args.private_remote}: {priv_url}")
-    log(f"   {args.public_remote}: {pub_url}")
-    log(f"✅ Branch (private full history): {branch} ({'unborn' if unborn else 'ok'})")
-    log(f"✅ Public branch (single commit): {args.public_branch}")
-    log("")
-
-    # 1) Private push (only if we have history)
-    if unborn:
-        log("ℹ️ Repo has no commits yet; skipping private push (nothing to push).")
-    else:
-        push_full_history(args.private_remote, branch)
+    failed = report_results(sync_repo(args))
+    if failed:
+        raise RuntimeError(f"Sync failed for remote(s): {', '.join(failed)}")
+    return 0
 
-    # 2) Public update
-    if args.public_mode == "snapshot":
-        # Keep existing behavior (force replace with a single commit)
-        msg = args.public_message or f"Public version: {last_commit_msg_or('snapshot')}"
-        env = author_env(args.preserve_author)
-        if unborn:
-            log("→ Building public snapshot from WORKING TREE (temporary index)…")
-            pub_commit = make_root_commit_from_worktree(msg, repo_root, env_overrides=env)
-        else:
-            log("→ Building public snapshot from HEAD tree…")
-            pub_commit = make_root_commit_from_head_tree(msg, env_overrides=env)
-        push_public_snapshot(args.public_remote, args.public_branch, pub_commit)
-        # Tag public commit with v<version> if available
-        version = read_version_from_package_json(repo_root)
-        if version:
-            tag_name = ensure_tag_prefix(version)
-            tag_and_push_public(tag_name, f"Release {tag_name}", pub_commit, args.public_remote)
-    else:
-        # Cherry-pick only the latest local commit onto the public tip
-        if unborn:
-            # No local commits to cherry-pick; publish a snapshot commit (first-time init)
-            log("ℹ️ Unborn HEAD locally; falling back to snapshot for public initialization.")
-            msg = args.public_message or "Public version: initial snapshot"
-            env = author_env(args.preserve_author)
-            pub_commit = make_root_commit_from_worktree(msg, repo_root, env_overrides=env)
-            push_public_snapshot(args.public_remote, args.public_branch, pub_commit)
-        else:
-            # Fetch public tip; if missing, initialize via snapshot to avoid pushing full history
-            if not fetch_public_tip(args.public_remote, args.public_branch):
-                log(f"ℹ️ Public branch '{args.public_branch}' not found. Initializing with snapshot (one commit).")
-                msg = args.public_message or f"Public version: {last_commit_msg_or('snapshot')}"
-                env = author_env(args.preserve_author)
-                pub_commit = make_root_commit_from_head_tree(msg, env_overrides=env)
-                push_public_snapshot(args.public_remote, args.public_branch, pub_commit)
+def report_results(results, spawns=None, round_trips=None):
+    """Log the outcome per remote; returns the labels that failed."""
+    failed = [label for entries in results.values() for label, ok, _ in entries if not ok]
+    log("\n🎉 Done." if not failed else "\n⚠️ Done with errors.")
+    for kind, key in (("Private", "private"), ("Public", "public")):
+        for label, ok, outcome in results[key]:
+            if ok:
+                log(f"   • {kind} ({label}): {outcome}")
             else:
-                # Determine last local commit
-                last_local = must(["git", "rev-parse", "HEAD"], "Getting last local commit")
-                try:
-                    cherry_pick_last_to_public(args.public_remote, args.public_branch, last_local)
-                    # Tag the public HEAD in the worktree by pushing a tag that points to the same commit
-                    version = read_version_from_package_json(repo_root)
-                    if version:
-                        tag_name = ensure_tag_prefix(version)
-                        # Fetch updated public branch to get its tip
-                        run(["git", "fetch", args.public_remote, args.public_branch])
-                        pub_tip = run(["git", "rev-parse", "FETCH_HEAD"]).stdout.strip()
-                        if pub_tip:
-                            tag_and_push_public(tag_name, f"Release {tag_name}", pub_tip, args.public_remote)
-                except Exception as e:
-                    log(f"⚠️ Cherry-pick to public failed; falling back to snapshot. Reason: {e}")
-                    msg = args.public_message or f"Public version: {last_commit_msg_or('snapshot')}"
-                    env = author_env(args.preserve_author)
-                    pub_commit = make_root_commit_from_head_tree(msg, env_overrides=env)
-                    push_public_snapshot(args.public_remote, args.public_branch, pub_commit)
-                    version = read_version_from_package_json(repo_root)
-                    if version:
-                        tag_name = ensure_tag_prefix(version)
-                        tag_and_push_public(tag_name, f"Release {tag_name}", pub_commit, args.public_remote)
-
-    log("\n🎉 Done.")
-    if unborn:
-        log("   • Private: skipped (no commits yet).")
-    else:
-        log("   • Private: full history updated.")
-    if args.public_mode == "snapshot":
-        log("   • Public: replaced with exactly one commit (fresh snapshot).")
-    else:
-        log("   • Public: updated by cherry-picking the latest commit onto public tip (or initialized via snapshot if missing).")
+                log(f"   • {kind} ({label}): ❌ failed: {outcome}")
+    log(f"   • Git processes spawned: {SPAWN_COUNT if spawns is None else spawns}; "
+        f"remote round trips: {ROUND_TRIPS if round_trips is None else round_trips}")
+    return failed
+
+def watched_tip(branch_arg):
+    """(branch, tip SHA or None), read through the session's cat-file pipe: polling spawns no process."""
+    git_session().invalidate()
+    branch = branch_arg or current_branch_guess()
+    return branch, git_session().resolve(f"refs/heads/{branch}")
+
+def watch(args):
+    """
+    --watch: stay running and sync whenever the branch tip moves.
+
+    Refs are polled every --watch-poll seconds (the stdlib has no inotify). A sync starts once
+    the tip has been still for --debounce seconds, so a burst of commits publishes once, and
+    at most once per --min-interval. Between syncs the process keeps its git session, SSH
+    masters, remote setup and the cached worktree, so a sync starts warm.
+    """
+    global SSH_CONTROL_PERSIST
+    # Keep SSH masters open across the quiet time between two syncs
+    SSH_CONTROL_PERSIST = int(max(SSH_CONTROL_PERSIST, args.min_interval + args.debounce + 60))
+    prepared = prepare_repo(args)
+    log(f"👀 Watching {prepared[0]} (poll {args.watch_poll:g}s, debounce {args.debounce:g}s, "
+        f"at most one sync per {args.min_interval:g}s). Press Ctrl-C to stop.")
+    seen = synced = None
+    changed_at, last_sync = 0.0, float("-inf")
+    try:
+        while True:
+            state = watched_tip(args.branch)
+            now = time.monotonic()
+            if state != seen:
+                if seen is None:
+                    changed_at = now - args.debounce  # sync the current state right away
+                else:
+                    changed_at = now
+                    log(f"↻ {state[0]} moved to {state[1][:7] if state[1] else '(no commits)'}")
+                seen = state
+            if seen != synced and now - changed_at >= args.debounce and now - last_sync >= args.min_interval:
+                last_sync = now
+                if sync_watched(args, prepared):
+                    synced = seen
+            time.sleep(args.watch_poll)
+    except KeyboardInterrupt:
+        log("\n👋 Stopped watching.")
+        return 0
+
+def sync_watched(args, prepared):
+    """One --watch sync; failures are logged and retried after --min-interval. Returns True on success."""
+    spawns, round_trips = SPAWN_COUNT, ROUND_TRIPS
+    log(f"\n→ Sync at {datetime.now().strftime('%H:%M:%S')}")
+    try:
+        with trace_span("sync_repos"):
+            failed = report_results(sync_repo(args, prepared), SPAWN_COUNT - spawns, ROUND_TRIPS - round_trips)
+    except Exception as e:
+        log(f"❌ Sync failed: {e}")
+        return False
+    finally:
+        if TRACER:
+            # The trace file always holds the latest sync; memory does not grow with uptime
+            write_trace(args.trace, args.trace_top)
+            TRACER.reset()
+    if failed:
+        log(f"   Retrying in {args.min_interval:g}s.")
+    return not failed
 
 if __name__ == "__main__":
     try:
-        open_log()
-        main()
+        exit_code = main()
     except Exception as e:
         log(f"\n❌ Error: {e}\n")
         sys.exit(1)
     finally:
+        stop_connection_sharing()
+        _DEFAULT_SESSION.close()
         close_log()
+    sys.exit(exit_code)